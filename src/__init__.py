@@ -2,6 +2,5 @@
 
 PACKAGE_VERSION = "1.0.0"
 
-print(f"Initializing the src package, version {PACKAGE_VERSION}")
-__all__ = ["main", "cleaning", "create_sleep_model", "files_import", "first_dataset_analysis", "first_dataset_excel", "gui", "plotting", "second_dataset_analysis", "to_csv"]
+__all__ = ["main", "analysis_stats", "cleaning", "cli", "compiled_forest", "create_sleep_model", "files_import", "first_dataset_analysis", "first_dataset_excel", "gui", "pipeline", "plotting", "prediction_server", "second_dataset_analysis", "to_csv"]
 
@@ -0,0 +1,178 @@
+'''
+Statistics behind the analysis figures, computed separately from the rendering.
+
+All the requested pairwise correlations come from a single correlation matrix, and the linear regressions of
+many groups (or many pairs of columns) are computed in one vectorized groupby with the closed-form least squares
+solution, giving the same numbers as `scipy.stats.linregress` run on each group. Results are cached in this process
+by the content of their data, so the heatmaps, the plots and the exported tables share one computation.
+'''
+
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+# Columns of a regression table, one row per group or pair
+regression_columns = ["n", "r", "p", "slope", "intercept", "std_err"]
+# Columns of the tidy results table: the analysis, the regressed columns, the group (empty for a whole pair) and the statistics
+result_columns = ["analysis", "x", "y", "group"] + regression_columns
+# Where the results table is exported, with the extension of each format
+results_path = "results/statistics"
+
+# Results already computed by this process, keyed by the statistic, its parameters and the data's fingerprint
+_statistics_memo: dict[tuple, pd.DataFrame] = {}
+
+
+def data_fingerprint(data):
+    """Returns a hash of the content of a DataFrame: its columns, dtypes and values."""
+    digest = hashlib.sha256(json.dumps([list(map(str, data.columns)), list(map(str, data.dtypes))]).encode())
+    digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _cached(name, data, params, compute):
+    """Returns a copy of a cached statistic, computing it on the first call."""
+    key = (name, json.dumps(params, default=str), data_fingerprint(data))
+    if key not in _statistics_memo:
+        _statistics_memo[key] = compute()
+    return _statistics_memo[key].copy()
+
+
+def correlation_matrix(data):
+    """
+    Returns the correlation matrix of the numeric columns (without the "User" column), computed once per data.
+
+    Every pair uses the rows where both of its columns have a value, so `matrix.loc[x, y]` matches
+    `data[[x, y]].corr().iloc[0, 1]` up to floating point rounding.
+    """
+    if "User" in data.columns: # Only use the numeric columns
+        data = data.drop(columns=["User"])
+    return _cached("correlation_matrix", data, {}, lambda: data.corr(numeric_only=True))
+
+
+def pair_correlations(data, pairs):
+    """Returns the correlation of every (x, y) pair, read from the correlation matrix of the data (its heatmap's)."""
+    matrix = correlation_matrix(data)
+    return {(x, y): matrix.loc[x, y] for x, y in pairs}
+
+
+def _regression_table(keys, x, y):
+    """
+    Fits y = slope * x + intercept for every group of `keys` in one pass, returns the `regression_columns`.
+
+    Uses the same formulas as `scipy.stats.linregress`: the centered sums of squares of each group,
+    the correlation clipped to [-1, 1] (0 if a column is constant), and the two-sided p value of the slope.
+    """
+    frame = pd.DataFrame({"key": keys, "x": np.asarray(x, dtype=float), "y": np.asarray(y, dtype=float)}).dropna()
+    grouped = frame.groupby("key", sort=False, observed=True)
+    means = grouped[["x", "y"]].transform("mean")
+    dx, dy = frame["x"] - means["x"], frame["y"] - means["y"]
+    sums = pd.DataFrame({"n": 1, "xx": dx * dx, "yy": dy * dy, "xy": dx * dy, "key": frame["key"]}).groupby(
+        "key", sort=False, observed=True).sum()
+    xmean, ymean = grouped["x"].mean(), grouped["y"].mean()
+
+    n = sums["n"]
+    ssxm, ssym, ssxym = sums["xx"] / n, sums["yy"] / n, sums["xy"] / n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = (ssxym / np.sqrt(ssxm * ssym)).clip(-1.0, 1.0).where((ssxm != 0) & (ssym != 0), 0.0)
+        slope = ssxym / ssxm
+        df = n - 2
+        tiny = 1.0e-20
+        t = r * np.sqrt(df / ((1.0 - r + tiny) * (1.0 + r + tiny)))
+        p = pd.Series(2 * stats.t.sf(np.abs(t), df), index=n.index)
+        std_err = np.sqrt((1 - r ** 2) * ssym / ssxm / df)
+
+    # With two points the line goes through both of them
+    two_points = n == 2
+    p = p.where(~two_points, (ssym == 0).astype(float))
+    std_err = std_err.where(~two_points, 0.0)
+    table = pd.DataFrame({"n": n, "r": r, "p": p, "slope": slope, "intercept": ymean - slope * xmean, "std_err": std_err})
+    # Fewer than two points have no regression
+    table.loc[n < 2, regression_columns[1:]] = np.nan
+    return table
+
+
+def group_regressions(data, group_col, x_col, y_col):
+    """
+    Returns the linear regression of `y_col` on `x_col` in every group of `group_col`, computed in a single groupby.
+
+    Parameters:
+    data (pd.DataFrame): The data.
+    group_col (str): Column of the groups.
+    x_col, y_col (str): The regressed columns, rows missing either one are left out.
+
+    Returns:
+    pd.DataFrame: One row per group, in order of first appearance, with the `regression_columns`.
+    """
+    def compute():
+        table = _regression_table(data[group_col], data[x_col], data[y_col])
+        table.index.name = group_col
+        return table
+    return _cached("group_regressions", data[[group_col, x_col, y_col]], [group_col, x_col, y_col], compute)
+
+
+def pair_regressions(data, pairs):
+    """
+    Returns the linear regression of y on x for every (x, y) pair of columns, computed in a single groupby.
+
+    Each pair uses the rows where both of its columns have a value.
+
+    Returns:
+    pd.DataFrame: One row per pair, indexed by (x, y), with the `regression_columns`.
+    """
+    def compute():
+        keys = np.repeat(np.arange(len(pairs)), len(data))
+        x = np.concatenate([data[x_col].to_numpy(dtype=float, na_value=np.nan) for x_col, _ in pairs])
+        y = np.concatenate([data[y_col].to_numpy(dtype=float, na_value=np.nan) for _, y_col in pairs])
+        table = _regression_table(keys, x, y).reindex(range(len(pairs)))
+        table.index = pd.MultiIndex.from_tuples(pairs, names=["x", "y"])
+        return table
+    columns = list(dict.fromkeys(column for pair in pairs for column in pair))
+    return _cached("pair_regressions", data[columns], [list(pair) for pair in pairs], compute)
+
+
+def tidy_regressions(table, analysis, x=None, y=None):
+    """
+    Converts a table of `pair_regressions`, or of `group_regressions` of `x` and `y`, to rows of the tidy results table.
+
+    Parameters:
+    table (pd.DataFrame): The regression table.
+    analysis (str): Name of the analysis the statistics belong to.
+    x, y (str, optional): The regressed columns of a `group_regressions` table.
+
+    Returns:
+    pd.DataFrame: The rows, with the `result_columns`.
+    """
+    if x is None:
+        tidy = table.reset_index().assign(group=pd.NA)
+    else:
+        tidy = table.rename_axis("group").reset_index().assign(x=x, y=y)
+    tidy["analysis"] = analysis
+    tidy["group"] = tidy["group"].astype("string")
+    tidy["n"] = tidy["n"].astype("Int64")
+    return tidy[result_columns]
+
+
+def export_results(results, base_path=results_path, formats=("csv",)):
+    """
+    Writes the tidy results table, once per format ("csv", "parquet" and/or "json"), named `base_path` + extension.
+
+    Returns:
+    list[str]: The written files.
+    """
+    os.makedirs(os.path.dirname(base_path) or ".", exist_ok=True)
+    paths = []
+    for file_format in formats:
+        path = f"{base_path}.{file_format}"
+        if file_format == "csv":
+            results.to_csv(path, index=False)
+        elif file_format == "parquet":
+            results.to_parquet(path, index=False)
+        elif file_format == "json":
+            results.to_json(path, orient="records", indent=2)
+        else:
+            raise ValueError(f"Unknown output format: {file_format}")
+        paths.append(path)
+    return paths
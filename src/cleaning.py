@@ -1,6 +1,10 @@
+import hashlib
+import json
+import os
 import re
 import numpy as np
 import pandas as pd
+import files_import
 
 def drop_blanks_and_nulls(data):
 
@@ -16,10 +20,41 @@ def drop_blanks_and_nulls(data):
         - The cleaned DataFrame with blank strings replaced by NaN and rows containing missing values dropped.
     """
     # Replace blank strings with NaN and drop rows with missing values
-    data = data.replace(r"^\s*$", np.nan, regex=True)
+    data = replace_blanks(data, np.nan)
     data = data.dropna()
     return data
 
+def replace_blanks(data, missing_value=np.nan):
+    r"""
+    The `replace_blanks` function replaces empty or whitespace-only strings with a missing value.
+
+    It gives the same result as `data.replace(r"^\s*$", missing_value, regex=True)`, but only the text columns are
+    checked, with vectorized string operations instead of a regex over every cell.
+
+    ### Parameters:
+    - `data` (pd.DataFrame):
+        - The input DataFrame potentially containing blank strings.
+    - `missing_value`:
+        - The value replacing the blank strings (`np.nan` or `pd.NA`).
+
+    ### Returns:
+    - `pd.DataFrame`:
+        - A new DataFrame with the blank strings replaced, the input is not modified.
+    """
+    blank_masks = {}
+    for column in data.select_dtypes(include=["object", "string"]).columns:
+        try:
+            is_blank = data[column].str.strip().eq("").fillna(False).astype(bool)
+        except AttributeError: # Object column without any strings
+            continue
+        if is_blank.any():
+            blank_masks[column] = is_blank
+
+    data = data.copy()
+    for column, is_blank in blank_masks.items():
+        data[column] = data[column].mask(is_blank, missing_value)
+    return data
+
 def extract_participant(filename):
     """
     The `extract_participant` function identifies and extracts the participant ID from the given filename using a specific pattern.
@@ -41,39 +76,235 @@ def extract_participant(filename):
         raise Exception("Multiple participants in name")
     return matches[0]
 
-def clean_sleep_data(file_path):
-    """Cleans the sleep data from a given CSV file by performing the following steps:
-    
-    1. Reads the data from the specified CSV file.
-    2. Drops the 'cohort' column.
-    3. Replaces blank values with NaN and removes rows containing blanks or nulls.
-    4. Converts all columns to numeric, coercing invalid parsing to NaN.
-    5. Removes outliers based on specific thresholds for 'bedtime_mssd' and 'daytime_sleep'.
+# Outlier thresholds of the sleep data
+max_variability = 5
+max_daytime_sleep = 150
+
+# Cleaned sleep datasets are cached here, keyed by the source file's hash, the cleaning parameters, the schema
+# and the version of the cleaning code
+sleep_cache_dir = "data/cache"
+# Increase when `clean_sleep_chunk` or `add_score_features` change, so the cached datasets are cleaned again
+sleep_cache_version = 1
+
+# Compact dtypes of the cmu-sleep columns, applied while reading the CSV
+sleep_schema = {
+    "subject_id": "Int32",
+    "study": "Int8",
+    "cohort": "category",
+    "demo_race": "Int8",
+    "demo_gender": "Int8",
+    "demo_firstgen": "Int8",
+    "bedtime_mssd": "float32",
+    "TotalSleepTime": "float32",
+    "midpoint_sleep": "float32",
+    "frac_nights_with_data": "float32",
+    "daytime_sleep": "float32",
+    "cum_gpa": "float32",
+    "term_gpa": "float32",
+    "term_units": "Int16",
+    "Zterm_units_ZofZ": "float32",
+}
+
+def apply_sleep_schema(data):
+    """Converts already read sleep columns to the dtypes of `sleep_schema`, invalid numeric values become NaN.
+
+    Columns that are not in the schema are only converted to numbers if they hold text.
+    Fractional and out of range values of the integer columns also become missing, as for the surveys
+    (see `files_import.apply_schema`).
+    """
+    for column in data.columns:
+        dtype = sleep_schema.get(column)
+        if dtype == "category":
+            data[column] = data[column].astype(dtype)
+        elif dtype is not None:
+            files_import.apply_schema(data, {column: dtype})
+        elif data[column].dtype == object:
+            data[column] = pd.to_numeric(data[column], errors="coerce")
+    return data
+
+def read_sleep_csv(file_path, columns=None):
+    """Reads a sleep CSV with the dtypes of `sleep_schema`, blank cells are read as missing values.
 
     Parameters:
     file_path (str): Path to the CSV file containing the data.
+    columns (list, optional): Only read these columns.
 
     Returns:
-    pd.DataFrame: The cleaned DataFrame.
+    pd.DataFrame: The typed data. Numeric columns holding text are converted with invalid values set to NaN.
     """
-    # Read the data
-    data = pd.read_csv(file_path)
-
-    # Drop the 'cohort' column
-    if "cohort" in data.columns:
-        data = data.drop("cohort", axis=1)
+    if columns is None:
+        columns = list(pd.read_csv(file_path, nrows=0).columns)
+    schema = {column: sleep_schema[column] for column in columns if column in sleep_schema}
+    # The integer columns are read untyped, then cast without wrapping or failing on fractional or too large values
+    integer_schema = {column: dtype for column, dtype in schema.items() if pd.api.types.is_integer_dtype(dtype)}
+    dtypes = {column: dtype for column, dtype in schema.items() if column not in integer_schema}
+    try:
+        data = pd.read_csv(file_path, usecols=columns, dtype=dtypes, skipinitialspace=True)
+    except (ValueError, TypeError):
+        # Some numeric column holds text, read it untyped and only convert what did not parse
+        data = pd.read_csv(file_path, usecols=columns, skipinitialspace=True)
+        return apply_sleep_schema(data)[columns]
+    return files_import.apply_schema(data, integer_schema)[columns]
 
+def clean_sleep_chunk(data, max_variability=max_variability, max_daytime_sleep=max_daytime_sleep):
+    """Removes the blanks, nulls and outliers of already typed sleep data, used for whole files and for chunks."""
     # Replace blanks with NaN and drop rows with blanks or nulls
-    data = data.replace(r"^\s*$", pd.NA, regex=True)  # Replace blanks with NaN
+    data = replace_blanks(data, pd.NA)  # Replace blanks with NaN, only text columns can hold them
     data = data.dropna()  # Remove rows with NaN values
 
-    # Convert all columns to numeric, coercing invalid values to NaN
-    data = data.apply(pd.to_numeric, errors="coerce")
-
     # Remove outliers based on thresholds
     if "bedtime_mssd" in data.columns:
-        data = data[data["bedtime_mssd"] <= 5]
+        data = data[data["bedtime_mssd"] <= max_variability]
     if "daytime_sleep" in data.columns:
-        data = data[data["daytime_sleep"] <= 150]
+        data = data[data["daytime_sleep"] <= max_daytime_sleep]
+
+    return data
+
+def clean_sleep_data(file_path, max_variability=max_variability, max_daytime_sleep=max_daytime_sleep):
+    """Cleans the sleep data from a given CSV file by performing the following steps:
+
+    1. Reads the data from the specified CSV file with compact dtypes, skipping the 'cohort' column.
+    2. Replaces blank values with NaN and removes rows containing blanks or nulls.
+    3. Removes outliers based on specific thresholds for 'bedtime_mssd' and 'daytime_sleep'.
+
+    Numeric columns that hold invalid values are converted while reading, with those values set to NaN.
+
+    Parameters:
+    file_path (str): Path to the CSV file containing the data.
+    max_variability (float): Rows with a larger 'bedtime_mssd' are outliers.
+    max_daytime_sleep (float): Rows with a larger 'daytime_sleep' are outliers.
+
+    Returns:
+    pd.DataFrame: The cleaned DataFrame.
+    """
+    # Read the data, without the 'cohort' column
+    columns = [column for column in pd.read_csv(file_path, nrows=0).columns if column != "cohort"]
+    return clean_sleep_chunk(read_sleep_csv(file_path, columns), max_variability, max_daytime_sleep)
+
+def iter_clean_sleep_chunks(file_path, chunksize=100_000, columns=None):
+    """Streams the cleaned sleep data of a CSV file chunk by chunk, so memory stays constant for any file size.
+
+    Every chunk goes through the same cleaning as `clean_sleep_data`. Only the requested columns are parsed,
+    plus 'bedtime_mssd' and 'daytime_sleep' which are still needed to remove the outliers. Blanks and nulls
+    are only checked in the columns that are read.
+
+    Parameters:
+    file_path (str): Path to the CSV file containing the data.
+    chunksize (int): Number of CSV rows read per chunk.
+    columns (list, optional): Columns to keep, by default every column except 'cohort'.
+
+    Yields:
+    pd.DataFrame: The cleaned rows of each chunk.
+    """
+    header = list(pd.read_csv(file_path, nrows=0).columns)
+    if columns is None:
+        columns = [column for column in header if column != "cohort"]
+    outlier_columns = [column for column in ("bedtime_mssd", "daytime_sleep") if column in header]
+    read_columns = list(dict.fromkeys(columns + outlier_columns))
+
+    # Dtypes are set after parsing, so that a chunk with invalid text does not stop the stream
+    categories = {column: "category" for column in read_columns if sleep_schema.get(column) == "category"}
+    for chunk in pd.read_csv(file_path, usecols=read_columns, dtype=categories, skipinitialspace=True, chunksize=chunksize):
+        chunk = clean_sleep_chunk(apply_sleep_schema(chunk[read_columns]))
+        yield chunk[columns]
+
+def clean_sleep_data_to_parquet(file_path, output_path, chunksize=100_000, columns=None):
+    """Cleans a sleep CSV chunk by chunk into a Parquet file, without ever holding the whole dataset in memory.
+
+    Parameters:
+    file_path (str): Path to the CSV file containing the data.
+    output_path (str): Path of the Parquet file to write.
+    chunksize (int): Number of CSV rows read per chunk.
+    columns (list, optional): Columns to keep, by default every column except 'cohort'.
+
+    Returns:
+    int: The number of cleaned rows written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    rows = 0
+    try:
+        for chunk in iter_clean_sleep_chunks(file_path, chunksize, columns):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+def add_score_features(data):
+    """Adds the score features to cleaned sleep data:
+
+    1. 'score', a weighted score (0-100), calculated as 25 times 'term_gpa'.
+    2. 'score_scaled', which scales 'term_gpa' within each 'study' group to a 0-100 range.
+    3. 'midpoint_sleep_hour', 'midpoint_sleep' transformed from minutes to hours in a 24-hour format.
+
+    Parameters:
+    data (pd.DataFrame): DataFrame containing the columns 'term_gpa', 'study', and 'midpoint_sleep'. It is modified in place.
+
+    Returns:
+    pd.DataFrame: The DataFrame with the new features added.
+    """
+    gpa_by_study = data.groupby("study")["term_gpa"]
+    gpa_min = gpa_by_study.transform("min")
+    data["score"] = 25 * data["term_gpa"]
+    data["score_scaled"] = 100 * (data["term_gpa"] - gpa_min) / (gpa_by_study.transform("max") - gpa_min)
+    data["midpoint_sleep_hour"] = ((data["midpoint_sleep"] / 60) + 23) % 24
+    return data
+
+def file_hash(file_path):
+    """Returns the SHA-256 hash of a file's content."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Cleaned sleep datasets already loaded by this process, keyed by file, modification time and cleaning parameters
+_clean_sleep_memo: dict[tuple, pd.DataFrame] = {}
+
+def load_clean_sleep_data(file_path, max_variability=max_variability, max_daytime_sleep=max_daytime_sleep,
+                          cache_dir=sleep_cache_dir):
+    """Provides the cleaned sleep data with its score features, shared by the analysis and the model.
+
+    The data is cleaned with `clean_sleep_data` and extended with `add_score_features` once per process, and
+    also kept as Parquet in `cache_dir` (unless it is None), named after the source file's hash, the cleaning
+    parameters, `sleep_schema` and `sleep_cache_version`, so it is only cleaned again when one of them changes.
+
+    Parameters:
+    file_path (str): Path to the CSV file containing the data.
+    max_variability (float): Rows with a larger 'bedtime_mssd' are outliers.
+    max_daytime_sleep (float): Rows with a larger 'daytime_sleep' are outliers.
+    cache_dir (str, optional): Directory of the on-disk cache.
+
+    Returns:
+    pd.DataFrame: A copy of the cleaned data, callers are free to modify it.
+    """
+    params = {"max_variability": max_variability, "max_daytime_sleep": max_daytime_sleep}
+    stat = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size, json.dumps(params, sort_keys=True))
+    if memo_key not in _clean_sleep_memo:
+        _clean_sleep_memo[memo_key] = _load_clean_sleep_data(file_path, params, cache_dir)
+    return _clean_sleep_memo[memo_key].copy()
+
+def _load_clean_sleep_data(file_path, params, cache_dir):
+    """Loads the cleaned sleep data from the on-disk cache, or cleans it and stores it there."""
+    cache_path = None
+    if cache_dir:
+        description = json.dumps({"params": params, "schema": sleep_schema, "version": sleep_cache_version},
+                                  sort_keys=True)
+        key = hashlib.sha256((file_hash(file_path) + description).encode()).hexdigest()
+        cache_path = os.path.join(cache_dir, f"sleep-{key[:16]}.parquet")
+        if os.path.exists(cache_path):
+            return pd.read_parquet(cache_path)
 
+    data = add_score_features(clean_sleep_data(file_path, **params))
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        data.to_parquet(cache_path)
     return data
@@ -0,0 +1,119 @@
+'''
+Command line interface of the whole pipeline, to run it without the GUI (for example in a cron job or on a server).
+
+Subcommands:
+- build: build the Excel file of the StudentLife surveys.
+- analyze: export the statistics of the analysis (correlations and regressions) as a table.
+- plot: save the graphs of the analysis into results/.
+- train: train the sleep score model and save it.
+- predict: score a CSV/Parquet file of sleep profiles with the saved model.
+
+Nothing here imports tkinter, and the graphs are rendered with the non-interactive Agg backend.
+'''
+
+import argparse
+import sys
+import matplotlib
+import pandas as pd
+
+import analysis_stats, cleaning, create_sleep_model, first_dataset_excel, pipeline, plotting
+
+excel_output_path = "data/output.xlsx"
+sleep_dataset_path = "data/cmu-sleep.csv"
+
+
+def build(args):
+    first_dataset_excel.build_excel(args.output, args.workers, args.cache_dir or None, args.formats,
+                                    progress=print)
+
+def analyze(args):
+    results = pipeline.analysis_results(pd.read_excel(args.excel), cleaning.load_clean_sleep_data(args.dataset))
+    for path in analysis_stats.export_results(results, args.output, args.formats):
+        print(f"Saved {path}")
+
+def plot(args):
+    ci = None if args.no_ci else plotting.regression_ci
+    pipeline.save_figures(args.excel, args.dataset, args.workers, print, args.force, ci, args.formats)
+
+def train(args):
+    if args.search:
+        artifact = create_sleep_model.search_and_save_model(args.dataset, args.models, folds=args.folds,
+                                                            time_budget=args.time_budget, n_jobs=args.n_jobs)
+    else:
+        artifact = create_sleep_model.train_and_save_model(args.dataset, args.models)
+    metrics = artifact["metadata"]["metrics"]
+    print(f"Saved the model trained with {artifact['metadata']['params']}")
+    print(", ".join(f"{name}: {value:.3f}" for name, value in metrics.items() if name.endswith(("mae", "r2"))))
+
+def predict(args):
+    create_sleep_model.score_file(args.input_path, args.output_path, args.dataset, args.chunksize, args.models,
+                                  args.retrain)
+
+
+def create_parser():
+    """Creates the parser of the command line, with one subcommand per stage of the pipeline."""
+    parser = argparse.ArgumentParser(description="Run the student life and sleep analysis without the GUI.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subcommands.add_parser("build", help="build the Excel file of the StudentLife surveys")
+    build_parser.add_argument("--output", default=excel_output_path, help="Excel file to write")
+    build_parser.add_argument("--workers", type=int, help="threads loading the survey folders")
+    build_parser.add_argument("--cache-dir", default=first_dataset_excel.survey_cache_dir,
+                              help="cache of the parsed surveys, empty to disable it")
+    build_parser.add_argument("--formats", nargs="*", default=[], choices=["csv", "parquet"],
+                              help="also write the table in these formats")
+    build_parser.set_defaults(function=build)
+
+    analyze_parser = subcommands.add_parser("analyze", help="export the statistics of the analysis")
+    analyze_parser.add_argument("--excel", default=excel_output_path, help="Excel file made by build")
+    analyze_parser.add_argument("--dataset", default=sleep_dataset_path, help="sleep dataset")
+    analyze_parser.add_argument("--output", default=analysis_stats.results_path, help="path of the table, without extension")
+    analyze_parser.add_argument("--formats", nargs="+", default=["csv"], choices=["csv", "parquet", "json"])
+    analyze_parser.set_defaults(function=analyze)
+
+    plot_parser = subcommands.add_parser("plot", help="save the graphs of the analysis into results/")
+    plot_parser.add_argument("--excel", default=excel_output_path, help="Excel file made by build")
+    plot_parser.add_argument("--dataset", default=sleep_dataset_path, help="sleep dataset")
+    plot_parser.add_argument("--workers", type=int, help="processes rendering the graphs")
+    plot_parser.add_argument("--force", action="store_true", help="render the unchanged graphs again")
+    plot_parser.add_argument("--no-ci", action="store_true", help="skip the bootstrapped confidence intervals")
+    plot_parser.add_argument("--formats", nargs="*", default=["csv", "json"], choices=["csv", "parquet", "json"],
+                             help="formats of the statistics table saved with the graphs")
+    plot_parser.set_defaults(function=plot)
+
+    train_parser = subcommands.add_parser("train", help="train the sleep score model and save it")
+    train_parser.add_argument("--dataset", default=sleep_dataset_path, help="sleep dataset")
+    train_parser.add_argument("--models", default=create_sleep_model.artifact_dir, help="directory of the saved models")
+    train_parser.add_argument("--search", action="store_true", help="search the hyperparameters with cross validation")
+    train_parser.add_argument("--folds", type=int, default=5, help="cross validation folds of the search")
+    train_parser.add_argument("--time-budget", type=float, help="seconds after which the search stops")
+    train_parser.add_argument("--n-jobs", type=int, default=-1, help="cores used by the search")
+    train_parser.set_defaults(function=train)
+
+    predict_parser = subcommands.add_parser("predict", help="score a CSV/Parquet file of sleep profiles")
+    predict_parser.add_argument("input_path", help=f"CSV or Parquet file with the columns {', '.join(create_sleep_model.features)}")
+    predict_parser.add_argument("output_path", help="CSV or Parquet file to write the predictions to")
+    predict_parser.add_argument("--dataset", default=sleep_dataset_path, help="sleep dataset the model is trained on")
+    predict_parser.add_argument("--chunksize", type=int, default=100_000, help="rows scored per predict call")
+    predict_parser.add_argument("--models", default=create_sleep_model.artifact_dir, help="directory of the saved models")
+    predict_parser.add_argument("--retrain", action="store_true", help="train the model again before scoring")
+    predict_parser.set_defaults(function=predict)
+    return parser
+
+
+def main(argv=None):
+    """Command line entry point, returns the exit code."""
+    args = create_parser().parse_args(argv)
+    matplotlib.use("Agg")
+    try:
+        args.function(args)
+    except (FileNotFoundError, KeyError, TypeError, ValueError) as e:
+        # A KeyError only holds the missing key, name it
+        message = f"Missing column or key: {e}" if isinstance(e, KeyError) else str(e)
+        print(f"Error: {message}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,18 @@
 
+import argparse
+import hashlib
+import json
+import os
+import time
+from typing import Any
+import numpy as np
 import pandas as pd
-from sklearn import metrics
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
+# scikit-learn and joblib are imported by the functions training or loading the full model,
+# serving the compiled model (see `get_compiled_model`) does not need them
 
 
 import cleaning
+import compiled_forest
 
 #     Variables
 
@@ -24,44 +30,53 @@ feature_names = [ "Average Sleep Per Night [hours]",
 col_to_predict = "score_scaled"
 
 studies_to_exclude = 5
-max_variability = 5
-max_daytime_sleep = 150
-
-def clean_model_data(file_path):
-  """Cleans and creates new features to better train the model."""
-
-  data = pd.read_csv(file_path)
-
-  # Make new feature - weighted score (0-100)
-  data["score"] = data.groupby("study")["term_gpa"].transform(lambda x: 25 * x)
-  # Scaling according to specific Universities scores
-  data["score_scaled"] = data.groupby("study")["term_gpa"].transform(
-      lambda x: 100 * (x - x.min()) / (x.max() - x.min())
-  )
-  # Translate columns into more understandable units
-  data['TotalSleepTime'] = data['TotalSleepTime'] / 60
+max_variability = cleaning.max_variability
+max_daytime_sleep = cleaning.max_daytime_sleep
 
+model_params = {"n_estimators": 200, "max_depth": 15, "random_state": 42}
 
-  #  Clean the data
-  data = data.drop("cohort", axis=1)
+# Hyperparameters tried by `search_model`, in this order
+param_grid = {
+    "n_estimators": [200, 100, 400],
+    "max_depth": [15, 10, None],
+    "min_samples_leaf": [1, 2, 4],
+}
 
-  data = cleaning.drop_blanks_and_nulls(data)
+# Trained models are saved here, one versioned artifact per dataset and hyperparameters
+artifact_dir = "models"
+artifact_version = 1
 
+def clean_model_data(file_path):
+  """Loads the shared cleaned data and prepares its features to better train the model."""
+  from sklearn.preprocessing import StandardScaler
 
-  data = data.apply(pd.to_numeric, errors="coerce")
+  # Cleaned once and shared with the analysis, including the weighted and scaled scores (0-100)
+  data = cleaning.load_clean_sleep_data(file_path, max_variability, max_daytime_sleep)
 
-  data = data[data["study"] != studies_to_exclude]
-  # Delete outliers
-  data = data[data["bedtime_mssd"]<= max_variability]
-  data = data[data["daytime_sleep"]<= max_daytime_sleep]
+  data = data[data["study"] != studies_to_exclude].copy()
+  # Translate columns into more understandable units
+  data['TotalSleepTime'] = data['TotalSleepTime'] / 60
 
   #   Scaling
   scaler = StandardScaler()
   data[features] = scaler.fit_transform(data[features])
   return data, scaler
 
-def train_model(data):
-  """Trains the model according to the given data and tests it."""
+def train_model(data, params=None, n_jobs=-1):
+  """Trains the model according to the given data and tests it, `params` default to `model_params`."""
+  model, _ = fit_and_evaluate(data, params, n_jobs)
+  return model
+
+def fit_and_evaluate(data, params=None, n_jobs=-1, progress=None, stages=10):
+  """
+  Trains the model on a 70/30 split using `n_jobs` cores (all by default), returns it with its test metrics.
+
+  If `progress` is given, the trees are grown in `stages` steps (with warm_start, giving the same forest as a
+  single fit) and `progress` is called after each one, so a long training can report its progress or be cancelled.
+  """
+  from sklearn import metrics
+  from sklearn.ensemble import RandomForestRegressor
+  from sklearn.model_selection import train_test_split
 
   #     Split the data
   X = data[features]
@@ -70,17 +85,116 @@ def train_model(data):
   X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
 
   #     Train the model
-  model = RandomForestRegressor(n_estimators=200,
-    max_depth=15,    
-    random_state=42)
-  model.fit(X_train, y_train)
+  model = RandomForestRegressor(n_jobs=n_jobs, **(params or model_params))
+  if progress is None:
+    model.fit(X_train, y_train)
+  else:
+    total = model.n_estimators
+    step = max(1, -(-total // stages))
+    model.set_params(warm_start=True)
+    for trees in range(step, total + step, step):
+      model.set_params(n_estimators=min(trees, total)).fit(X_train, y_train)
+      progress(f"Trained {model.n_estimators}/{total} trees")
+    model.set_params(warm_start=False)
 
   # evaluate the model
   predictions = model.predict(X_test)
   mae = metrics.mean_absolute_error(y_test, predictions)
   r2 = metrics.r2_score(y_test, predictions)
-  # print(f"MAE: {mae}, R²: {r2}") # If you'd like to see the metrics of the model
-  return model
+  return model, {"test_mae": mae, "test_r2": r2}
+
+def search_model(data, grid=None, folds=5, time_budget=None, n_jobs=-1, random_state=42):
+  """
+  Searches the hyperparameters of the model with k-fold cross-validation, then trains the best ones on all the data.
+
+  The folds of every candidate are fitted in parallel, and the trees of each fold on its share of the `n_jobs`
+  cores, so every core is used even with fewer folds than cores. Candidates are tried in grid order,
+  and the search stops early once `time_budget` seconds have passed (at least one candidate is always tried).
+
+  Parameters:
+  data (pd.DataFrame): The prepared data, as returned by `clean_model_data`.
+  grid (dict, optional): Lists of values per hyperparameter, by default `param_grid`.
+  folds (int): Number of cross-validation folds.
+  time_budget (float, optional): Seconds after which no new candidate is started.
+  n_jobs (int): Number of cores used, -1 for all of them.
+  random_state (int): Seed of the folds and the forests.
+
+  Returns:
+  tuple: The best model and a dict of metrics (best parameters, their CV MAE/R², and the result of every candidate).
+  """
+  from sklearn.ensemble import RandomForestRegressor
+  from sklearn.model_selection import KFold, ParameterGrid, cross_validate
+
+  X = data[features]
+  y = data[col_to_predict]
+  cv = KFold(n_splits=folds, shuffle=True, random_state=random_state)
+  candidates = list(ParameterGrid(grid or param_grid))
+  fold_jobs, tree_jobs = _split_jobs(n_jobs, folds)
+
+  start = time.perf_counter()
+  results = []
+  for params in candidates:
+    if results and time_budget is not None and time.perf_counter() - start >= time_budget:
+      break
+    params = {**params, "random_state": random_state}
+    scores = cross_validate(RandomForestRegressor(n_jobs=tree_jobs, **params), X, y, cv=cv, n_jobs=fold_jobs,
+                            scoring=("neg_mean_absolute_error", "r2"))
+    results.append({
+      "params": params,
+      "cv_mae": float(-scores["test_neg_mean_absolute_error"].mean()),
+      "cv_r2": float(scores["test_r2"].mean()),
+      "fit_seconds": float(scores["fit_time"].sum()),
+    })
+
+  best = min(results, key=lambda result: result["cv_mae"])
+  model = RandomForestRegressor(n_jobs=n_jobs, **best["params"]).fit(X, y)
+  search_metrics = {
+    "best_params": best["params"],
+    "cv_mae": best["cv_mae"],
+    "cv_r2": best["cv_r2"],
+    "folds": folds,
+    "candidates_tried": len(results),
+    "candidates_total": len(candidates),
+    "stopped_early": len(results) < len(candidates),
+    "seconds": time.perf_counter() - start,
+    "results": results,
+  }
+  return model, search_metrics
+
+def _split_jobs(n_jobs, folds):
+  """Splits `n_jobs` cores (-1 for all) between the folds fitted in parallel and the trees of each fold."""
+  from joblib import effective_n_jobs
+
+  cores = effective_n_jobs(n_jobs)
+  fold_jobs = min(folds, cores)
+  return fold_jobs, -(-cores // fold_jobs)
+
+def convert_bedtimes_to_minutes_after_10(bedtimes, total_sleep_times):
+    """
+    Converts bedtimes in HH:MM format and the hours of sleep to the sleep midpoints, in minutes after 10:00 PM.
+
+    Parameters:
+    bedtimes (array-like): The bedtimes, as HH:MM strings.
+    total_sleep_times (array-like or float): The hours of sleep of every bedtime.
+
+    Returns:
+    np.ndarray: The midpoints as whole minutes, a midpoint before 10:00 PM counts as the next day.
+    """
+    times = pd.Series(np.asarray(bedtimes, dtype=str).ravel()).str.extract(r"^(\d{1,2}):(\d{1,2})$").astype(float)
+    hours, minutes = times[0].to_numpy(), times[1].to_numpy()
+    if not (np.isfinite(hours).all() and (hours < 24).all() and (minutes < 60).all()):
+        raise ValueError("Invalid time format. Please enter in HH:MM format.")
+
+    midpoint = hours * 60 + minutes + np.asarray(total_sleep_times, dtype=float) * 60 / 2
+    difference = midpoint - 22 * 60
+    # Handle cases where time is before 10 PM
+    difference = np.where(difference < 0, difference + 24 * 60, difference)  # Adjust to next day
+    difference = np.where(difference > 24 * 60, difference - 24 * 60, difference)  # Adjust to range 0-1440 (a single day)
+    return np.trunc(difference).astype(int)
+
+def convert_bedtime_to_minutes_after_10(time_str, total_sleep_time):
+    """Converts a bedtime in HH:MM format and the hours of sleep to the sleep midpoint, in minutes after 10:00 PM."""
+    return int(convert_bedtimes_to_minutes_after_10([time_str], total_sleep_time)[0])
 
 def predict_user_input(model, scaler):
     """Get user input for features, preprocess them, and make predictions using the trained model."""
@@ -110,3 +224,216 @@ def predict_user_input(model, scaler):
     return prediction[0]
 
 
+def artifact_key(dataset_hash, params):
+    """Returns the key of a model artifact, derived from the dataset, the hyperparameters and the artifact version."""
+    description = json.dumps({"dataset": dataset_hash, "params": params, "version": artifact_version}, sort_keys=True)
+    return hashlib.sha256(description.encode()).hexdigest()[:16]
+
+def artifact_path(directory, dataset_hash, params):
+    """Returns the path of the saved model artifact of a dataset and hyperparameters."""
+    return os.path.join(directory, f"sleep_model-{artifact_key(dataset_hash, params)}.joblib")
+
+def save_model_artifact(path, model, scaler, metadata):
+    """Saves a trained model, its fitted scaler and their metadata to a single file.
+
+    The metadata (including the model's metrics) is also written next to it as JSON, to be read without loading the model,
+    and the compiled model (see `compiled_forest`) as .npz, to be served without scikit-learn.
+    """
+    import joblib
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    joblib.dump({"model": model, "scaler": scaler, "metadata": metadata}, path)
+    compiled_forest.compile_forest(model, scaler).save(os.path.splitext(path)[0] + ".npz")
+    with open(os.path.splitext(path)[0] + ".json", "w") as metadata_file:
+        json.dump(metadata, metadata_file, indent=2)
+
+def load_model_artifact(path):
+    """Loads a saved model artifact, returns None if it is missing or was saved by another version."""
+    import joblib
+    import sklearn
+    if not os.path.exists(path):
+        return None
+    artifact = joblib.load(path)
+    metadata = artifact.get("metadata", {})
+    if metadata.get("version") != artifact_version or metadata.get("sklearn_version") != sklearn.__version__:
+        return None
+    return artifact
+
+def train_and_save_model(file_path, directory=artifact_dir, params=None, progress=None):
+    """Trains the model on a dataset and saves it as a versioned artifact, returns the loaded artifact.
+
+    `progress`, if given, is called with a short message during the training (see `fit_and_evaluate`).
+    """
+    params = params or model_params
+    dataset_hash = cleaning.file_hash(file_path)
+    data, scaler = clean_model_data(file_path)
+    model, model_metrics = fit_and_evaluate(data, params, progress=progress)
+    return _save_trained_model(directory, dataset_hash, params, model, scaler, model_metrics)
+
+def search_and_save_model(file_path, directory=artifact_dir, grid=None, folds=5, time_budget=None, n_jobs=-1):
+    """Runs `search_model` on a dataset and saves the best model with its metrics, returns the saved artifact.
+
+    The artifact is saved under the best hyperparameters, so `get_model(file_path, params=...)` with them loads it.
+    """
+    dataset_hash = cleaning.file_hash(file_path)
+    data, scaler = clean_model_data(file_path)
+    model, search_metrics = search_model(data, grid, folds, time_budget, n_jobs)
+    return _save_trained_model(directory, dataset_hash, search_metrics["best_params"], model, scaler, search_metrics)
+
+def _save_trained_model(directory, dataset_hash, params, model, scaler, model_metrics):
+    """Saves a trained model as the artifact of its dataset and hyperparameters."""
+    import sklearn
+    metadata = {
+        "version": artifact_version,
+        "dataset_hash": dataset_hash,
+        "params": params,
+        "features": features,
+        "sklearn_version": sklearn.__version__,
+        "metrics": model_metrics,
+    }
+    artifact = {"model": model, "scaler": scaler, "metadata": metadata}
+    save_model_artifact(artifact_path(directory, dataset_hash, params), **artifact)
+    return artifact
+
+# Artifacts already loaded by this process, keyed by dataset file, modification time and hyperparameters
+_loaded_artifacts: dict[tuple, Any] = {}
+
+def get_model(file_path, directory=artifact_dir, params=None, retrain=False, progress=None):
+    """
+    Returns the trained model and fitted scaler for a dataset, training the model only when needed.
+
+    The model is looked up in this process first, then in the saved artifact matching the dataset's hash and
+    the hyperparameters, and is only trained (and saved) when neither exists or when `retrain` is True.
+
+    Parameters:
+    file_path (str): Path to the sleep dataset.
+    directory (str): Directory of the saved artifacts.
+    params (dict, optional): Hyperparameters of the model, by default `model_params`.
+    retrain (bool): Train and save the model again even if an artifact exists.
+    progress (callable, optional): Called with a short message during the training, if the model is trained.
+
+    Returns:
+    tuple: The model and the scaler.
+    """
+    artifact = _get_artifact(file_path, directory, params, retrain, progress)
+    return artifact["model"], artifact["scaler"]
+
+def get_compiled_model(file_path, directory=artifact_dir, params=None, progress=None):
+    """
+    Returns the compiled version of the model of `get_model`, which predicts the same scores (up to floating point rounding) with a much lower
+    overhead per call. Its `predict` takes the unscaled profiles, the scaler is part of the compiled model.
+
+    The compiled model is loaded from the saved .npz without importing scikit-learn. Only when it is missing,
+    the full model is loaded (or trained) with `get_model`, and its compiled version is saved for the next time.
+    """
+    params = params or model_params
+    memo_key = ("compiled",) + _artifact_memo_key(file_path, directory, params)
+    if memo_key not in _loaded_artifacts:
+        compiled_path = os.path.splitext(artifact_path(directory, cleaning.file_hash(file_path), params))[0] + ".npz"
+        compiled = compiled_forest.load_compiled_forest(compiled_path)
+        if compiled is None:
+            artifact = _get_artifact(file_path, directory, params, progress=progress)
+            compiled = compiled_forest.compile_forest(artifact["model"], artifact["scaler"])
+            compiled.save(compiled_path)
+        _loaded_artifacts[memo_key] = compiled
+    return _loaded_artifacts[memo_key]
+
+def _artifact_memo_key(file_path, directory, params):
+    """Returns the key of the models loaded by this process for a dataset file, its version and the hyperparameters."""
+    stat = os.stat(file_path)
+    return (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size, os.path.abspath(directory),
+            json.dumps(params, sort_keys=True))
+
+def _get_artifact(file_path, directory=artifact_dir, params=None, retrain=False, progress=None):
+    """Returns the loaded artifact of a dataset and hyperparameters, see `get_model`."""
+    params = params or model_params
+    memo_key = _artifact_memo_key(file_path, directory, params)
+
+    if retrain or memo_key not in _loaded_artifacts:
+        artifact = None
+        if not retrain:
+            artifact = load_model_artifact(artifact_path(directory, cleaning.file_hash(file_path), params))
+        _loaded_artifacts[memo_key] = artifact or train_and_save_model(file_path, directory, params, progress)
+        # A retrained model replaces the compiled one loaded before
+        _loaded_artifacts.pop(("compiled",) + memo_key, None)
+    return _loaded_artifacts[memo_key]
+
+
+def predict_batch(model, scaler, data, chunksize=100_000):
+    """
+    Scores many sleep profiles at once, applying the scaler and the model to vectorized chunks.
+
+    Parameters:
+    model: The trained model.
+    scaler (StandardScaler): The scaler fitted on the training data.
+    data (pd.DataFrame): The profiles, with a column for each of the `features`, in the same units as the GUI
+        inputs (TotalSleepTime in hours, the other features as in the dataset).
+    chunksize (int): Number of rows scored per `predict` call.
+
+    Returns:
+    np.ndarray: The predicted score of every row.
+    """
+    predictions = np.empty(len(data))
+    # The features are taken out of the frame once, every chunk is a view of the same array
+    values = data[features].to_numpy(dtype=float)
+    for start in range(0, len(data), chunksize):
+        chunk = pd.DataFrame(values[start:start + chunksize], columns=features)
+        scaled_chunk = pd.DataFrame(scaler.transform(chunk), columns=features)
+        predictions[start:start + chunksize] = model.predict(scaled_chunk)
+    return predictions
+
+def read_table(path):
+    """Reads a CSV or Parquet file, according to its extension."""
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+def write_table(data, path):
+    """Writes a CSV or Parquet file, according to its extension."""
+    if path.endswith(".parquet"):
+        data.to_parquet(path, index=False)
+    else:
+        data.to_csv(path, index=False)
+
+def score_file(input_path, output_path, sleep_dataset_path="data/cmu-sleep.csv", chunksize=100_000,
+               directory=artifact_dir, retrain=False):
+    """
+    Scores every sleep profile of a CSV/Parquet file with the saved model and writes the predictions.
+
+    The output holds the input rows with an added `predicted_<col_to_predict>` column. Instead of `midpoint_sleep`,
+    the input can have a `bedtime` column (HH:MM), converted with the hours of sleep as in the GUI.
+
+    Returns:
+    dict: The number of rows, the scoring time in seconds and the throughput in rows per second.
+    """
+    model, scaler = get_model(sleep_dataset_path, directory, retrain=retrain)
+    data = read_table(input_path)
+    if "midpoint_sleep" not in data.columns and {"bedtime", "TotalSleepTime"} <= set(data.columns):
+        data["midpoint_sleep"] = convert_bedtimes_to_minutes_after_10(data["bedtime"], data["TotalSleepTime"])
+    missing = [feature for feature in features if feature not in data.columns]
+    if missing:
+        raise ValueError(f"Missing feature columns: {missing}")
+
+    start = time.perf_counter()
+    data[f"predicted_{col_to_predict}"] = predict_batch(model, scaler, data, chunksize)
+    seconds = time.perf_counter() - start
+    write_table(data, output_path)
+
+    rows_per_second = len(data) / seconds if seconds > 0 else float("inf")
+    print(f"Scored {len(data)} rows in {seconds:.3f}s ({rows_per_second:,.0f} rows/second)")
+    return {"rows": len(data), "seconds": seconds, "rows_per_second": rows_per_second}
+
+def main(argv=None):
+    """Command line entry point for batch scoring."""
+    parser = argparse.ArgumentParser(description="Score a CSV/Parquet file of student sleep profiles.")
+    parser.add_argument("input_path", help=f"CSV or Parquet file with the columns {', '.join(features)}")
+    parser.add_argument("output_path", help="CSV or Parquet file to write the predictions to")
+    parser.add_argument("--dataset", default="data/cmu-sleep.csv", help="sleep dataset the model is trained on")
+    parser.add_argument("--chunksize", type=int, default=100_000, help="rows scored per predict call")
+    parser.add_argument("--models", default=artifact_dir, help="directory of the saved models")
+    parser.add_argument("--retrain", action="store_true", help="train the model again before scoring")
+    args = parser.parse_args(argv)
+    score_file(args.input_path, args.output_path, args.dataset, args.chunksize, args.models, args.retrain)
+
+
+if __name__ == "__main__":
+    main()
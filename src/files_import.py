@@ -1,46 +1,275 @@
 # Imports
+import hashlib
+import json
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 
+# Column that records the source file of every cached row
+source_column = "Source_File"
+
+
+def list_json_files(directory_path):
+    """Returns the sorted names of the .json files in a directory."""
+    return sorted(file_name for file_name in os.listdir(directory_path) if file_name.endswith(".json"))
+
+
+def apply_schema(data, schema):
+    """Converts the columns listed in `schema` (column -> dtype) to their compact dtype, invalid values become missing.
+
+    For integer dtypes, non-numeric, fractional and out of range values are invalid.
+    """
+    for column, dtype in (schema or {}).items():
+        if column in data.columns:
+            values = pd.to_numeric(data[column], errors="coerce")
+            if pd.api.types.is_integer_dtype(dtype):
+                limits = np.iinfo(pd.api.types.pandas_dtype(dtype).type)
+                values = values.where((values % 1 == 0) & values.between(limits.min, limits.max))
+            data[column] = values.astype(dtype)
+    return data
+
+
+def compact_user_column(data):
+    """Stores the User column as a categorical, every user ID is repeated on all of its rows."""
+    if "User" in data.columns:
+        data["User"] = data["User"].astype("category")
+    return data
+
+
+def read_json_file(directory_path, file_name, schema=None):
+    """Reads a single user's JSON file and adds the user ID (taken from the file name) as the first column.
+
+    If a `schema` (column -> dtype) is given, those columns are converted to their compact dtype right away.
+    """
+    user_id = file_name.split("_")[1].split(".")[0]
+    # Timestamps stay as epoch seconds, date guessing is per file and can mix types across the files of a folder
+    data = pd.read_json(os.path.join(directory_path, file_name), convert_dates=False)
+    apply_schema(data, schema)
+    data.insert(0, "User", user_id) # Add the user ID as the first column
+    return data
+
+
+def _make_executor(workers, use_processes):
+    """Creates the pool used to read the JSON files."""
+    if use_processes:
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+def iter_folder_frames(directory_path, workers=None, use_processes=False, file_names=None, schema=None):
+    """
+    Streams the JSON files of a directory as one DataFrame per file, in file name order.
+
+    Files are read concurrently, but only a bounded window of files (twice the worker count) is read ahead,
+    so memory stays proportional to a few files and not to the whole folder.
+
+    ### Parameters:
+    - `directory_path` (str): The path to the directory containing the JSON files.
+    - `workers` (int, optional): The number of threads/processes reading files. Defaults to the executor's default.
+    - `use_processes` (bool): If `True`, files are parsed in a process pool instead of a thread pool.
+    - `file_names` (list[str], optional): Only read these files instead of every JSON file in the directory.
+    - `schema` (dict, optional): Compact dtypes of the answer columns (see `read_json_file`).
+
+    ### Yields:
+    - `tuple[str, pd.DataFrame]`: The file name and the DataFrame read from it.
+    """
+    if file_names is None:
+        file_names = list_json_files(directory_path)
+    if not file_names:
+        return
+
+    window = 2 * (workers or os.cpu_count() or 1)
+    with _make_executor(workers, use_processes) as executor:
+        pending = deque()
+        names = iter(file_names)
+        for file_name in names:
+            pending.append((file_name, executor.submit(read_json_file, directory_path, file_name, schema)))
+            if len(pending) >= window:
+                break
+        while pending:
+            file_name, future = pending.popleft()
+            next_name = next(names, None)
+            if next_name is not None:
+                pending.append((next_name, executor.submit(read_json_file, directory_path, next_name, schema)))
+            yield file_name, future.result()
+
+
+def read_folder(directory_path, workers=None, use_processes=False, schema=None):
+    """
+    Reads all the JSON files of a directory concurrently and combines them with a single concat.
+
+    ### Parameters:
+    - `directory_path` (str): The path to the directory containing the JSON files.
+    - `workers` (int, optional): The number of threads/processes reading files.
+    - `use_processes` (bool): If `True`, files are parsed in a process pool instead of a thread pool.
+    - `schema` (dict, optional): Compact dtypes of the answer columns (see `read_json_file`).
+
+    ### Returns:
+    - `pd.DataFrame`: The combined data with a categorical User column, or an empty DataFrame if the directory has no JSON files.
+    """
+    frames = [data for _, data in iter_folder_frames(directory_path, workers, use_processes, schema=schema)]
+    if not frames:
+        return pd.DataFrame()
+    return compact_user_column(pd.concat(frames, ignore_index=True))
+
+
+def folder_signature(directory_path):
+    """Returns the modification time and size of every JSON file in a directory, used to detect changed files."""
+    signature = {}
+    for file_name in list_json_files(directory_path):
+        stat = os.stat(os.path.join(directory_path, file_name))
+        signature[file_name] = [stat.st_mtime_ns, stat.st_size]
+    return signature
+
+
+def cache_paths(directory_path, cache_dir):
+    """Returns the Parquet data file and JSON manifest file that cache a directory inside `cache_dir`."""
+    folder = os.path.abspath(directory_path)
+    key = hashlib.sha1(folder.encode()).hexdigest()[:12]
+    name = os.path.basename(folder).replace(" ", "_") + "-" + key
+    return os.path.join(cache_dir, name + ".parquet"), os.path.join(cache_dir, name + ".json")
+
+
+def load_cache(data_path, manifest_path, folder, schema):
+    """Loads a cached DataFrame and its manifest, or returns (None, None) if there is no usable cache for the folder and schema."""
+    if not (os.path.exists(data_path) and os.path.exists(manifest_path)):
+        return None, None
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get("folder") != folder or manifest.get("schema") != schema or not isinstance(manifest.get("files"), dict):
+        return None, None
+    return pd.read_parquet(data_path), manifest
+
+
+def read_folder_cached(directory_path, cache_dir, workers=None, use_processes=False, schema=None):
+    """
+    Same as `read_folder`, but keeps the combined DataFrame in a Parquet file inside `cache_dir`.
+
+    The cache has a manifest with the modification time, size, columns and dtypes of every JSON file,
+    and the cached rows remember which file they came from. When the folder changes, only the new or modified
+    files are parsed: their rows are spliced into the cached frame, and the rows of modified or deleted files
+    are removed, so the result matches a full `read_folder` of the folder.
+
+    ### Parameters:
+    - `directory_path` (str): The path to the directory containing the JSON files.
+    - `cache_dir` (str): The directory holding the cache files. It is created if needed.
+    - `workers` (int, optional): The number of threads/processes reading the changed files.
+    - `use_processes` (bool): If `True`, files are parsed in a process pool instead of a thread pool.
+    - `schema` (dict, optional): Compact dtypes of the answer columns. Changing it invalidates the cache.
+
+    ### Returns:
+    - `pd.DataFrame`: The combined data, identical to what `read_folder` returns.
+    """
+    folder = os.path.abspath(directory_path)
+    schema = schema or {}
+    data_path, manifest_path = cache_paths(directory_path, cache_dir)
+    signature = folder_signature(directory_path)
+    cached_data, manifest = load_cache(data_path, manifest_path, folder, schema)
+    cached_files = manifest["files"] if manifest else {}
+
+    unchanged = [name for name in signature if name in cached_files and cached_files[name]["signature"] == signature[name]]
+    changed = [name for name in signature if name not in unchanged]
+
+    if manifest and not changed and len(unchanged) == len(cached_files):
+        return cached_data.drop(columns=[source_column])
+
+    files = {name: cached_files[name] for name in unchanged}
+    frames = []
+    if cached_data is not None and unchanged:
+        frames.append(cached_data[cached_data[source_column].isin(unchanged)])
+    for file_name, data in iter_folder_frames(directory_path, workers, use_processes, changed, schema):
+        files[file_name] = {
+            "signature": signature[file_name],
+            "columns": list(data.columns),
+            "dtypes": [str(dtype) for dtype in data.dtypes],
+        }
+        frames.append(data.assign(**{source_column: file_name}))
+
+    combined_data = compact_user_column(splice_frames(frames, files, list(signature)))
+    write_cache(combined_data, {"folder": folder, "schema": schema, "files": files}, data_path, manifest_path)
+    return combined_data.drop(columns=[source_column])
+
+
+def splice_frames(frames, files, file_names):
+    """
+    Combines cached and freshly parsed rows into the frame a full rebuild would produce.
+
+    Rows are ordered by source file (in `file_names` order) and columns in order of first appearance.
+    A column that every file has with the same dtype gets that dtype back, since the rows of a deleted
+    file may have forced a wider dtype on the cached frame.
+    """
+    if not frames:
+        return pd.DataFrame(columns=[source_column])
+
+    columns = list(dict.fromkeys(column for name in file_names for column in files[name]["columns"]))
+    combined_data = pd.concat(frames, ignore_index=True)
+    combined_data[source_column] = pd.Categorical(combined_data[source_column], categories=file_names, ordered=True)
+    combined_data = combined_data.sort_values(source_column, kind="stable", ignore_index=True)
+    combined_data = combined_data[columns + [source_column]]
+
+    for column in columns:
+        dtypes = {files[name]["dtypes"][files[name]["columns"].index(column)]
+                  for name in file_names if column in files[name]["columns"]}
+        present_everywhere = all(column in files[name]["columns"] for name in file_names)
+        if present_everywhere and len(dtypes) == 1 and str(combined_data[column].dtype) not in dtypes:
+            combined_data[column] = combined_data[column].astype(dtypes.pop())
+    return combined_data
+
+
+def write_cache(data, manifest, data_path, manifest_path):
+    """Writes a cached DataFrame and its manifest. Data that cannot be stored as Parquet is simply not cached."""
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    try:
+        data.to_parquet(data_path)
+    except (ImportError, ValueError, TypeError) as e:
+        print(f"Could not cache {manifest['folder']}: {e}")
+        return
+    with open(manifest_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file)
+
 
 # Function to turn json files into pandas df and exports a csv file
-def folder_to_csv(directory_path, column_to_check, make_csv):
+def folder_to_csv(directory_path, column_to_check, make_csv, workers=None, use_processes=False, cache_dir=None, schema=None):
     """
     The `folder_to_csv` function reads JSON files from a given directory, combines them into a single DataFrame,
     filters rows based on a specified column, and optionally exports the result to a CSV file.
 
     ### Parameters:
-    - `directory_path` (str): 
-        - The path to the directory containing the JSON files. 
+    - `directory_path` (str):
+        - The path to the directory containing the JSON files.
         - Each JSON file is expected to follow a naming convention where a user ID is embedded in the file name.
-    - `column_to_check` (str): 
-        - The column name used for filtering out rows with missing values (`NaN`). 
+    - `column_to_check` (str):
+        - The column name used for filtering out rows with missing values (`NaN`).
         - If the column is not found or the combined data is empty, the function returns an empty DataFrame.
-    - `make_csv` (bool): 
+    - `make_csv` (bool):
         - If `True`, the filtered DataFrame is saved as a CSV file in the same directory.
         - The CSV file is named based on the directory name with the suffix `_data.csv`.
+    - `workers` (int, optional):
+        - The number of threads/processes used to read the files (see `read_folder`).
+    - `use_processes` (bool):
+        - If `True`, the files are parsed in a process pool instead of a thread pool.
+    - `cache_dir` (str, optional):
+        - If given, the combined data is cached in this directory (see `read_folder_cached`).
+    - `schema` (dict, optional):
+        - Compact dtypes (column -> dtype) applied to the answer columns while reading each file.
 
     ### Returns:
-    - `pd.DataFrame`: 
+    - `pd.DataFrame`:
         - A DataFrame containing the combined and filtered data from all JSON files in the directory.
+        - Timestamp columns such as `resp_time` are kept as epoch seconds (integers), they are not converted to datetimes.
 
     ### Example Usage:
     ```python
     # Example: Combining JSON files in a directory and exporting filtered results to a CSV file
     filtered_df = folder_to_csv("/path/to/json_directory", "target_column", make_csv=True)
     """
-    
-    combined_data = pd.DataFrame()
 
-    # Loop through all files in the directory
-    for file_name in os.listdir(directory_path):
-        if file_name.endswith(".json"):
-            user_id = file_name.split("_")[1].split(".")[0]
-            file_path = os.path.join(directory_path, file_name)
-            data = pd.read_json(file_path)
-            data.insert(0, "User", user_id) # Add the user ID as the first column
-            combined_data = pd.concat([combined_data, data], ignore_index=True)
-    
+    if cache_dir:
+        combined_data = read_folder_cached(directory_path, cache_dir, workers, use_processes, schema)
+    else:
+        combined_data = read_folder(directory_path, workers, use_processes, schema)
 
     if combined_data.empty or column_to_check not in combined_data.columns:
         return pd.DataFrame()  # Returns an empty DataFrame if there is no data or if the column does not exist
@@ -53,4 +282,3 @@ def folder_to_csv(directory_path, column_to_check, make_csv):
         filtered_data.to_csv(output_csv, index=True)
 
     return filtered_data
-
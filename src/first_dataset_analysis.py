@@ -1,17 +1,40 @@
+import os
 import matplotlib.pyplot as plt
 import pandas as pd
 import plotly.figure_factory as ff
 import plotly.io as pio
 import seaborn as sns
-from plotting import plot_correlation, plot_correlation_matrix
+import analysis_stats
+import plotting
+from plotting import correlation_job, correlation_matrix_job, plot_correlation, plot_correlation_matrix
+
+interactive_heat_map_path = "results/plot.html"
+
+# All the correlation pairs that are plotted
+correlations = [
+    ("avg_working_percentage", "gpa_all"),
+    ("avg_workout_per_day", "gpa_all"),
+    ("stressed_percentage", "gpa_all"),
+    ("avg_sad_rating", "gpa_all"),
+    ("avg_sleep_rating", "happy_percentage"),
+    ("avg_sleep_rating", "avg_stress_level"),
+    ("number_of_people", "avg_happy_rating"),
+    ("stressed_percentage", "avg_workout_per_day"),
+    ("happy_percentage", "avg_workout_per_day"),
+    ("avg_sleep_rating", "gpa_13s"),
+    ("avg_sleep_hours", "gpa_13s")
+]
 
 def make_interactive_heat_map(df):
     """
-    Creates an interactive heatmap using plotly
+    Creates an interactive heatmap using plotly, skipped if it was already made from the same data
     """
     pio.renderers.default = "iframe_connected"
     df_numeric = df.drop(columns=["User"])
-    correlation_matrix = df_numeric.corr()
+    fingerprint = plotting.figure_fingerprint("interactive_heatmap", df_numeric, {})
+    if plotting.is_figure_current(plotting.load_figure_manifest(), interactive_heat_map_path, fingerprint):
+        return
+    correlation_matrix = analysis_stats.correlation_matrix(df_numeric) # Shared with the other figures
     fig = ff.create_annotated_heatmap(
         z=correlation_matrix.values,
         x=list(df_numeric.columns),
@@ -19,31 +42,40 @@ def make_interactive_heat_map(df):
         colorscale="RdBu",
         annotation_text=correlation_matrix.round(2).values
     )
-    fig.write_html("results/plot.html")
+    os.makedirs(os.path.dirname(interactive_heat_map_path), exist_ok=True)
+    fig.write_html(interactive_heat_map_path)
+    plotting.record_figures({interactive_heat_map_path: {"kind": "interactive_heatmap", "fingerprint": fingerprint}})
 
 def plot_all_correlations(df, show_choice, save_choice):
     """
     Plots all specified correlations
     """
-    # Define all correlation pairs
-    correlations = [
-        ("avg_working_percentage", "gpa_all"),
-        ("avg_workout_per_day", "gpa_all"),
-        ("stressed_percentage", "gpa_all"),
-        ("avg_sad_rating", "gpa_all"),
-        ("avg_sleep_rating", "happy_percentage"),
-        ("avg_sleep_rating", "avg_stress_level"),
-        ("number_of_people", "avg_happy_rating"),
-        ("stressed_percentage", "avg_workout_per_day"),
-        ("happy_percentage", "avg_workout_per_day"),
-        ("avg_sleep_rating", "gpa_13s"),
-        ("avg_sleep_hours", "gpa_13s")
-    ]
-    
     # Plot individual correlations
     for x, y in correlations:
         plot_correlation(df, x, y, show_choice=show_choice, save_choice=save_choice)
 
+def figure_jobs(df, ci=plotting.regression_ci):
+    """
+    Describes the figures saved by the analysis (the correlation heatmap and every correlation plot),
+    to be rendered in parallel with `plotting.render_figures`.
+    Every correlation comes from the heatmap's correlation matrix, and the regression lines (without
+    a bootstrapped confidence interval, `ci` None) are fitted together by `analysis_stats.pair_regressions`
+    """
+    pair_correlations = analysis_stats.pair_correlations(df, correlations)
+    regressions = analysis_stats.pair_regressions(df, correlations) if ci is None else None
+    jobs = [correlation_matrix_job(df, "Students life")]
+    for x, y in correlations:
+        regression = regressions.loc[(x, y)] if regressions is not None else None
+        jobs.append(correlation_job(df, x, y, pair_correlations[(x, y)], regression, ci))
+    return jobs
+
+def correlation_results(df):
+    """
+    Returns the statistics of every plotted correlation pair (r, p value, slope, intercept, std error and n)
+    as rows of the tidy results table (see `analysis_stats.tidy_regressions`)
+    """
+    return analysis_stats.tidy_regressions(analysis_stats.pair_regressions(df, correlations), "Students life")
+
 def run_full_data_analysis(file_path="data/output.xlsx", show_choice=0, save_choice=0):
     """
     Main function to run the complete data analysis
@@ -7,128 +7,258 @@ Each file needs highly specific cleaning and analysis, therefore each one has a
 
 '''
 
+import json
 import os
-from tkinter import messagebox
+import re
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-from openpyxl import Workbook
 
 import files_import
 
-# Define the dataset paths
+# Define the dataset paths, and the compact dtype of the answer columns of every survey
+answer_code = "Int8"
 survey_datasets = {
-    "Mood": {"Path": "data/StudentLife/dataset/EMA/response/Mood", "Important_Column": "happyornot"},
-    "Mood1": {"Path": "data/StudentLife/dataset/EMA/response/Mood 1", "Important_Column": "tomorrow"},
-    "Mood2": {"Path": "data/StudentLife/dataset/EMA/response/Mood 2", "Important_Column": "how"},
-    "Exercise": {"Path": "data/StudentLife/dataset/EMA/response/Exercise", "Important_Column": "have"},
-    "Stress": {"Path": "data/StudentLife/dataset/EMA/response/Stress", "Important_Column": "level"},
-    "Social": {"Path": "data/StudentLife/dataset/EMA/response/Social", "Important_Column": "number"},
-    "Sleep": {"Path": "data/StudentLife/dataset/EMA/response/Sleep", "Important_Column": "hour"},
-    "Activity": {"Path": "data/StudentLife/dataset/EMA/response/Activity", "Important_Column": "working"}
+    "Mood": {"Path": "data/StudentLife/dataset/EMA/response/Mood", "Important_Column": "happyornot",
+             "Schema": {"happyornot": answer_code, "happy": answer_code, "sadornot": answer_code, "sad": answer_code}},
+    "Mood1": {"Path": "data/StudentLife/dataset/EMA/response/Mood 1", "Important_Column": "tomorrow",
+              "Schema": {"tomorrow": answer_code}},
+    "Mood2": {"Path": "data/StudentLife/dataset/EMA/response/Mood 2", "Important_Column": "how",
+              "Schema": {"how": answer_code}},
+    "Exercise": {"Path": "data/StudentLife/dataset/EMA/response/Exercise", "Important_Column": "have",
+                 "Schema": {"have": answer_code, "exercise": answer_code, "walk": answer_code}},
+    "Stress": {"Path": "data/StudentLife/dataset/EMA/response/Stress", "Important_Column": "level",
+               "Schema": {"level": answer_code}},
+    "Social": {"Path": "data/StudentLife/dataset/EMA/response/Social", "Important_Column": "number",
+               "Schema": {"number": answer_code}},
+    "Sleep": {"Path": "data/StudentLife/dataset/EMA/response/Sleep", "Important_Column": "hour",
+              "Schema": {"hour": answer_code, "rate": answer_code}},
+    "Activity": {"Path": "data/StudentLife/dataset/EMA/response/Activity", "Important_Column": "working",
+                 "Schema": {"working": answer_code, "relaxing": answer_code, "other_working": answer_code, "other_relaxing": answer_code}}
 }
 
 
 grades_file_path = "data/StudentLife/dataset/education/grades.csv"
 
+# Parsed survey folders are cached here, and only the folders that changed are parsed again
+survey_cache_dir = "data/cache"
+
+# What each answer code of the surveys stands for
+answer_mappings = {
+    "stress": {1:3, 2:4, 3:5, 4:2, 5:1},
+    "social": {1:2, 2:7, 3:15, 4:30, 5:75, 6:150},
+    "exercise": {1:0, 2:15, 3:45, 4:75, 5:110},
+    "sleep_hour": {
+        1:2, 2:3.5, 3:4, 4:4.5, 5:5, 6:5.5, 7:6, 8:6.5, 9:7, 10:7.5, 11:8, 12:8.5, 13:9, 14:9.5, 15:10, 16:10.5, 17:11, 18:11.5, 19:12
+    },
+    # Making sure that higher rating means better sleep
+    "sleep_rate": {1:4, 2:3, 3:2, 4:1},
+    "percentage_spent": {1:5, 2:18, 3:38, 4:63, 5:88},
+}
+
+# Optional JSON file overriding the mappings above, e.g. {"stress": {"1": 3, "2": 4}}
+answer_mappings_path = "data/answer_mappings.json"
+
+def compile_mapping(mapping):
+    """Compiles an answer mapping into a lookup array indexed by answer code, codes without a value are NaN."""
+    if any(not isinstance(code, int) or code < 0 for code in mapping):
+        raise ValueError(f"Answer codes must be non-negative integers: {list(mapping)}")
+    lookup_table = np.full(max(mapping, default=-1) + 1, np.nan)
+    for code, value in mapping.items():
+        lookup_table[code] = value
+    return lookup_table
+
+lookup_tables = {name: compile_mapping(mapping) for name, mapping in answer_mappings.items()}
+
+def load_answer_mappings(path=answer_mappings_path):
+    """Returns the lookup tables of the answer mappings, with the overrides of a JSON file if the file exists.
+
+    The default `lookup_tables` are left unchanged, so every build reads the file again.
+    """
+    tables = dict(lookup_tables)
+    if not os.path.exists(path):
+        return tables
+    with open(path) as mappings_file:
+        overrides = json.load(mappings_file)
+    for name, mapping in overrides.items():
+        tables[name] = compile_mapping({int(code): value for code, value in mapping.items()})
+    return tables
+
+def map_answers(answers, mapping_name, tables=lookup_tables):
+    """Recodes a column of answer codes with a single lookup array gather, using the `tables` of the mappings.
+
+    Missing, non-numeric, fractional, negative and unknown codes all become NaN.
+    """
+    lookup_table = tables[mapping_name]
+    codes = pd.to_numeric(answers, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    known = (codes >= 0) & (codes < len(lookup_table)) & (codes == np.floor(codes))
+    values = np.full(len(codes), np.nan)
+    values[known] = lookup_table[codes[known].astype(np.intp)]
+    return pd.Series(values, index=answers.index, name=answers.name)
+
 def initialize_excel_file(output_path):
-    """Creates a new Excel file or deletes the existing one."""
+    """Checks for the survey data and deletes the existing Excel file."""
     # Check for the data, error if not
-    load_survey_data()
+    check_survey_data()
 
     if os.path.exists(output_path):
         os.remove(output_path)
         print(f"Deleted existing file: {output_path}")
-    wb = Workbook()
-    wb.save(output_path)
-    print(f"Created new empty file: {output_path}")
 
-def load_survey_data():
-    """Loads and processes survey data into a dictionary."""
-    all_data = {}
+def check_survey_data():
+    """Checks that every survey folder exists and holds JSON files, without parsing them.
+
+    Returns a manifest of the JSON file names found for each survey.
+    Raises FileNotFoundError if a folder is missing or empty.
+    """
+    manifest = {}
     for survey, dictionary in survey_datasets.items():
-        combined_data = files_import.folder_to_csv(dictionary["Path"], dictionary["Important_Column"], 0)
-        all_data[survey] = combined_data
-    return all_data
-
-def create_user_column(output_path):
-    """Ensures the User column exists in the Excel file."""
-    df = pd.read_excel(output_path)
-    uids = [f"u{i:02d}" for i in range(60)]
-    if "User" in df.columns:
-        df["User"] = uids
-    else:
-        df.insert(0, "User", uids)
-    df.to_excel(output_path, index=False)
+        if not os.path.isdir(dictionary["Path"]):
+            raise FileNotFoundError(f"Missing survey folder: {dictionary['Path']}")
+        manifest[survey] = files_import.list_json_files(dictionary["Path"])
+        if not manifest[survey]:
+            raise FileNotFoundError(f"No JSON files in survey folder: {dictionary['Path']}")
+    return manifest
+
+def load_survey(survey, cache_dir=None):
+    """Loads the combined data of a single survey."""
+    dictionary = survey_datasets[survey]
+    return files_import.folder_to_csv(dictionary["Path"], dictionary["Important_Column"], 0, cache_dir=cache_dir,
+                                      schema=dictionary.get("Schema"))
+
+def load_survey_data(workers=None, cache_dir=None):
+    """Loads the survey folders concurrently into a dictionary, one worker per folder by default.
+
+    If `cache_dir` is given, unchanged folders are reloaded from the cache instead of being parsed.
+    """
+    with ThreadPoolExecutor(max_workers=workers or len(survey_datasets)) as executor:
+        loaded = executor.map(lambda survey: load_survey(survey, cache_dir), survey_datasets)
+        return dict(zip(survey_datasets, loaded))
+
+def user_sort_key(user):
+    """Sorts user IDs by their number, so that u100 comes after u99."""
+    match = re.fullmatch(r"(\D*)(\d+)", user)
+    if match is None:
+        return (user, -1)
+    return (match.group(1), int(match.group(2)))
+
+def discover_users(all_data, grades_data):
+    """Returns the sorted union of the user IDs found in the surveys and the grades, as a categorical index."""
+    users = set(grades_data["User"].dropna())
+    for data in all_data.values():
+        if "User" in data.columns:
+            users.update(data["User"].dropna().unique())
+    users = sorted(map(str, users), key=user_sort_key)
+    return pd.CategoricalIndex(users, categories=users, name="User")
+
+def create_user_column(users):
+    """Creates the output table with a row for every user."""
+    return pd.DataFrame({"User": pd.Categorical(users, categories=users)})
 
-def process_stress_social(all_data, combined_csv):
+# Per-user aggregations of every survey: output column -> (source column, aggregation)
+user_aggregations = {
+    "Social": {"number_of_people": ("number_of_people", "mean")},
+    "Stress": {"avg_stress_level": ("stress_level", "mean")},
+    "Exercise": {
+        "amount_of_workouts": ("workout", "sum"),
+        "avg_workout_time": ("exercise_time", "mean"),
+        "avg_walk_time": ("walk_time", "mean"),
+    },
+    "Sleep": {
+        "avg_sleep_hours": ("sleep_hours", "mean"),
+        "avg_sleep_rating": ("sleep_rate", "mean"),
+    },
+    "Mood": {
+        "avg_happy_rating": ("happy", "mean"),
+        "avg_sad_rating": ("sad", "mean"),
+    },
+    "Mood2": {
+        "total_mood_entries": ("how", "sum"),
+        "happy_entry_sum": ("happy_entry", "sum"),
+        "sad_entry_sum": ("sad_entry", "sum"),
+        "stressed_entry_sum": ("stressed_entry", "sum"),
+    },
+    "Activity": {
+        "avg_alone_percentage": ("alone_percentage", "mean"),
+        "avg_together_percentage": ("together_percentage", "mean"),
+        "avg_working_percentage": ("working_percentage", "mean"),
+        "avg_relaxing_percentage": ("relaxing_percentage", "mean"),
+    },
+}
+
+def aggregate_by_user(data, survey):
+    """Runs all the per-user aggregations of a survey in a single groupby pass.
+
+    A sum is NaN for a user without any value, just like a sum over the user's filtered rows would be missing.
+    """
+    spec = dict(user_aggregations[survey])
+    sums = [column for column, (_, func) in spec.items() if func == "sum"]
+    for column in sums:
+        spec[column + "_count"] = (spec[column][0], "count")
+
+    users = data["User"].astype("category")
+    result = data.groupby(users, observed=True).agg(**spec)
+    for column in sums:
+        result[column] = result[column].where(result.pop(column + "_count") > 0)
+    result.index = result.index.astype(str)
+    return result
+
+def process_stress_social(all_data, combined_csv, tables=lookup_tables):
     """Processes stress and social activity columns."""
-    stress_mapping = {1:3, 2:4, 3:5, 4:2, 5:1}
-    social_mapping = {1:2, 2:7, 3:15, 4:30, 5:75, 6:150}
-    all_data["Stress"]["stress_level"] = all_data["Stress"]["level"].map(stress_mapping)
-    all_data["Social"]["number_of_people"] = all_data["Social"]["number"].map(social_mapping)
-    combined_csv["number_of_people"] = all_data["Social"].groupby("User")["number_of_people"].mean()
-    combined_csv["avg_stress_level"] = all_data["Stress"].groupby("User")["stress_level"].mean()
-
-def process_exercise(all_data, combined_csv):
+    all_data["Stress"]["stress_level"] = map_answers(all_data["Stress"]["level"], "stress", tables)
+    all_data["Social"]["number_of_people"] = map_answers(all_data["Social"]["number"], "social", tables)
+    combined_csv.update(aggregate_by_user(all_data["Social"], "Social").items())
+    combined_csv.update(aggregate_by_user(all_data["Stress"], "Stress").items())
+
+def process_exercise(all_data, combined_csv, tables=lookup_tables):
     """Processes exercise-related columns."""
-    exercise_mapping = {1:0, 2:15, 3:45, 4:75, 5:110}
     semester_length_in_days = 65
     exercise_data = all_data["Exercise"]
-    exercise_data["exercise_time"] = exercise_data["exercise"].map(exercise_mapping)
-    exercise_data["walk_time"] = exercise_data["walk"].map(exercise_mapping)
-    combined_csv["amount_of_workouts"] = exercise_data[exercise_data["have"] == 1].groupby("User")["have"].sum()
-    combined_csv["avg_workout_per_day"] = combined_csv["amount_of_workouts"] / semester_length_in_days
-    combined_csv["avg_workout_time"] = exercise_data.groupby("User")["exercise_time"].mean()
-    combined_csv["avg_walk_time"] = exercise_data.groupby("User")["walk_time"].mean()
-
-def process_sleep(all_data, combined_csv):
-    """Crating the sleep related columns"""
-    sleep_hour_mapping = {
-        1:2, 2:3.5, 3:4, 4:4.5, 5:5, 6:5.5, 7:6, 8:6.5, 9:7, 10:7.5, 11:8, 12:8.5, 13:9, 14:9.5, 15:10, 16:10.5, 17:11, 18:11.5, 19:12
-    }
-    # Making sure that higher rating means better sleep
-    sleep_rate_mapping = {1:4, 2:3, 3:2, 4:1}
+    exercise_data["exercise_time"] = map_answers(exercise_data["exercise"], "exercise", tables)
+    exercise_data["walk_time"] = map_answers(exercise_data["walk"], "exercise", tables)
+    exercise_data["workout"] = exercise_data["have"].where(exercise_data["have"] == 1)
+    aggregated = aggregate_by_user(exercise_data, "Exercise")
+    combined_csv["amount_of_workouts"] = aggregated["amount_of_workouts"]
+    combined_csv["avg_workout_per_day"] = aggregated["amount_of_workouts"] / semester_length_in_days
+    combined_csv["avg_workout_time"] = aggregated["avg_workout_time"]
+    combined_csv["avg_walk_time"] = aggregated["avg_walk_time"]
 
+def process_sleep(all_data, combined_csv, tables=lookup_tables):
+    """Crating the sleep related columns"""
     sleep_data = all_data["Sleep"]
-    sleep_data["sleep_hours"] = sleep_data["hour"].map(sleep_hour_mapping)
-    sleep_data["sleep_rate"] = sleep_data["rate"].map(sleep_rate_mapping)
-    combined_csv["avg_sleep_hours"] = sleep_data.groupby("User")["sleep_hours"].mean()
-    combined_csv["avg_sleep_rating"] = sleep_data.groupby("User")["sleep_rate"].mean()
+    sleep_data["sleep_hours"] = map_answers(sleep_data["hour"], "sleep_hour", tables)
+    sleep_data["sleep_rate"] = map_answers(sleep_data["rate"], "sleep_rate", tables)
+    combined_csv.update(aggregate_by_user(sleep_data, "Sleep").items())
 
 def process_mood(all_data, combined_csv):
     """Crating the mood related columns"""
-    sad_happy_data = all_data["Mood"]
     feeling_data = all_data["Mood2"]
     # Cleaning the data
-    sad_happy_data = sad_happy_data.dropna(subset=["happy"])
+    sad_happy_data = all_data["Mood"].dropna(subset=["happy", "sad"]).copy()
     sad_happy_data.loc[sad_happy_data["happyornot"] == 2, "happy"] = 0
-    sad_happy_data = sad_happy_data.dropna(subset=["sad"])
     sad_happy_data.loc[sad_happy_data["sadornot"] == 2, "sad"] = 0
+    # Only keep the answers of each kind, so that their sum counts them
+    feeling_data["happy_entry"] = feeling_data["how"].where(feeling_data["how"] == 1)
+    feeling_data["stressed_entry"] = feeling_data["how"].where(feeling_data["how"] == 2)
+    feeling_data["sad_entry"] = feeling_data["how"].where(feeling_data["how"] == 3)
     # Analysing
-    average_happy_rating = sad_happy_data.groupby("User")["happy"].mean()
-    average_sad_rating = sad_happy_data.groupby("User")["sad"].mean()
-
-    total_mood_entries = feeling_data.groupby("User")["how"].sum()
-    happy_entry_sum = feeling_data[feeling_data["how"] == 1].groupby("User")["how"].sum()
-    sad_entry_sum = feeling_data[feeling_data["how"] == 3].groupby("User")["how"].sum()
-    stressed_entry_sum = feeling_data[feeling_data["how"] == 2].groupby("User")["how"].sum()
+    ratings = aggregate_by_user(sad_happy_data, "Mood")
+    entries = aggregate_by_user(feeling_data, "Mood2")
     # Adding to combined df
-    combined_csv["avg_happy_rating"] = average_happy_rating
-    combined_csv["avg_sad_rating"] = average_sad_rating
-    combined_csv["happy_percentage"] = (happy_entry_sum/total_mood_entries)*100
-    combined_csv["sad_percentage"] = (sad_entry_sum/total_mood_entries)*100
-    combined_csv["stressed_percentage"] = (stressed_entry_sum/total_mood_entries)*100
+    combined_csv["avg_happy_rating"] = ratings["avg_happy_rating"]
+    combined_csv["avg_sad_rating"] = ratings["avg_sad_rating"]
+    combined_csv["happy_percentage"] = (entries["happy_entry_sum"]/entries["total_mood_entries"])*100
+    combined_csv["sad_percentage"] = (entries["sad_entry_sum"]/entries["total_mood_entries"])*100
+    combined_csv["stressed_percentage"] = (entries["stressed_entry_sum"]/entries["total_mood_entries"])*100
 
-def process_time_managment(all_data, combined_csv):
+def process_time_managment(all_data, combined_csv, tables=lookup_tables):
     """Crating the columns related to how the students manage their time"""
-    percentage_spent_mapping = {
-        1:5, 2:18, 3:38, 4:63, 5:88
-    }
     time_spent_data = all_data["Activity"]
 
-    time_spent_data["alone_working"] = time_spent_data["working"].map(percentage_spent_mapping)
-    time_spent_data["alone_relaxing"] = time_spent_data["relaxing"].map(percentage_spent_mapping)
-    time_spent_data["together_working"] = time_spent_data["other_working"].map(percentage_spent_mapping)
-    time_spent_data["together_relaxing"] = time_spent_data["other_relaxing"].map(percentage_spent_mapping)
+    time_spent_data["alone_working"] = map_answers(time_spent_data["working"], "percentage_spent", tables)
+    time_spent_data["alone_relaxing"] = map_answers(time_spent_data["relaxing"], "percentage_spent", tables)
+    time_spent_data["together_working"] = map_answers(time_spent_data["other_working"], "percentage_spent", tables)
+    time_spent_data["together_relaxing"] = map_answers(time_spent_data["other_relaxing"], "percentage_spent", tables)
     time_spent_data["total_time_spent"] = time_spent_data["together_relaxing"] + time_spent_data["together_working"] + time_spent_data["alone_relaxing"] + time_spent_data["alone_working"]
 
     # Percentages
@@ -138,54 +268,68 @@ def process_time_managment(all_data, combined_csv):
     time_spent_data["relaxing_percentage"] = (time_spent_data["alone_relaxing"] + time_spent_data["together_relaxing"])/time_spent_data["total_time_spent"]  * 100
 
     # adding averages
-    combined_csv["avg_alone_percentage"] = time_spent_data.groupby("User")["alone_percentage"].mean()
-    combined_csv["avg_together_percentage"] = time_spent_data.groupby("User")["together_percentage"].mean()
-    combined_csv["avg_working_percentage"] = time_spent_data.groupby("User")["working_percentage"].mean()
-    combined_csv["avg_relaxing_percentage"] = time_spent_data.groupby("User")["relaxing_percentage"].mean()
-
-
-
-def create_grades_dictionary():
-    """Processes the GPA-related columns."""
-    grades_data = pd.read_csv(grades_file_path)
-    final_grades_data = {f"u{i:02d}": {"gpaAll": None, "gpa_13s": None} for i in range(60)}
-    for student in range(len(grades_data["uid"])):
-        name = grades_data["uid"][student]
-        if name in final_grades_data:
-            final_grades_data[name] = {
-                "gpaAll": grades_data[" gpa all"][student] * 25,
-                "gpa_13s": grades_data[" gpa 13s"][student] * 25
-            }
-    return final_grades_data
-
-def merge_data_with_output(combined_csv, output_path):
-    """Merges the processed data into the Excel output file."""
-    df_output = pd.read_excel(output_path)
+    combined_csv.update(aggregate_by_user(time_spent_data, "Activity").items())
+
+
+
+def create_grades_table():
+    """Processes the GPA-related columns into a table with a row per user."""
+    grades_data = pd.read_csv(grades_file_path, skipinitialspace=True)
+    grades_data.columns = grades_data.columns.str.strip() # The file's column names start with a space
+    grades_data = grades_data.drop_duplicates(subset="uid", keep="last")
+    return pd.DataFrame({
+        "User": grades_data["uid"].str.strip(),
+        "gpa_all": grades_data["gpa all"] * 25,
+        "gpa_13s": grades_data["gpa 13s"] * 25,
+    })
+
+def merge_data_with_output(df_output, combined_csv):
+    """Merges the processed data into the output table."""
     combined_csv = pd.DataFrame(combined_csv)
-    df_output = df_output.merge(combined_csv, on="User", how="left")
-    df_output.to_excel(output_path, index=False)
+    return df_output.merge(combined_csv, on="User", how="left")
+
+def write_output(df, output_path, extra_formats=()):
+    """Writes the output table to the Excel file, and optionally next to it as Parquet and/or CSV.
+
+    `extra_formats` can hold "parquet" and "csv", the extra files share the Excel file's name.
+    """
+    df.to_excel(output_path, index=False)
+    base_path = os.path.splitext(output_path)[0]
+    for file_format in extra_formats:
+        if file_format == "parquet":
+            df.to_parquet(base_path + ".parquet", index=False)
+        elif file_format == "csv":
+            df.to_csv(base_path + ".csv", index=False)
+        else:
+            raise ValueError(f"Unknown output format: {file_format}")
     print("The file has been successfully updated!")
 
-def build_excel(output_path = "data/output.xlsx"):
-    try:
-        """Runs the full data processing pipeline."""
-        initialize_excel_file(output_path)
-        all_data = load_survey_data()
-        create_user_column(output_path)
-        combined_csv = {}
-        process_stress_social(all_data, combined_csv)
-        process_exercise(all_data, combined_csv)
-        process_sleep(all_data, combined_csv)
-        process_mood(all_data, combined_csv)
-        process_time_managment(all_data, combined_csv)
-        grades_info = create_grades_dictionary()
-        df = pd.read_excel(output_path)
-        for index, row in df.iterrows():
-            student_id = row["User"]
-            df.at[index, "gpa_all"] = grades_info[student_id]["gpaAll"]
-            df.at[index, "gpa_13s"] = grades_info[student_id]["gpa_13s"]
-        df.to_excel(output_path, index=False)
-        merge_data_with_output(combined_csv, output_path)
-    except(FileNotFoundError, ValueError, RuntimeError) as e:
-        messagebox.showerror("Dataset not found", f"Please download dataset and place in data directory.\nhttps://studentlife.cs.dartmouth.edu/datasets.html\n{str(e)}")
+# Where to download the StudentLife dataset, shown when it is missing
+dataset_url = "https://studentlife.cs.dartmouth.edu/datasets.html"
+
+def build_excel(output_path = "data/output.xlsx", workers=None, cache_dir=survey_cache_dir, extra_formats=(),
+                mappings_path=answer_mappings_path, progress=None):
+    """Runs the full data processing pipeline in memory and writes the output once.
 
+    `progress`, if given, is called with a short message before every stage.
+    Raises FileNotFoundError if the dataset is missing (see `check_survey_data`), the caller reports it.
+    """
+    progress = progress or (lambda message: None)
+    progress("Checking the survey data")
+    initialize_excel_file(output_path)
+    tables = load_answer_mappings(mappings_path) # Read for every build, the file can change between builds
+    progress("Loading the surveys")
+    all_data = load_survey_data(workers, cache_dir) # Parsed once and shared by every process_* stage
+    grades_data = create_grades_table()
+    df = create_user_column(discover_users(all_data, grades_data))
+    combined_csv = {}
+    progress("Processing the surveys")
+    process_stress_social(all_data, combined_csv, tables)
+    process_exercise(all_data, combined_csv, tables)
+    process_sleep(all_data, combined_csv, tables)
+    process_mood(all_data, combined_csv)
+    process_time_managment(all_data, combined_csv, tables)
+    df = df.merge(grades_data, on="User", how="left")
+    df = merge_data_with_output(df, combined_csv)
+    progress("Writing the output")
+    write_output(df, output_path, extra_formats)
@@ -1,11 +1,15 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
+import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
 import first_dataset_analysis, first_dataset_excel, second_dataset_analysis, create_sleep_model
+import pipeline
+import multiprocessing
 import os
 import pandas as pd
-from datetime import datetime, timedelta
+import queue
+import threading
 
 
 def ensure_results_directory():
@@ -14,37 +18,146 @@ def ensure_results_directory():
         os.makedirs("results")
 
 def convert_bedtime_to_minutes_after_10(time_str, total_sleep_time):
-    """Converts a time in HH:MM format to minutes after 11:00 PM."""
-    try:
-        # Parse the time entered by the user
-        bedtime = datetime.strptime(time_str, "%H:%M")
-        print(f"before: {bedtime}")
-        length_of_sleep = timedelta(minutes=(total_sleep_time * 60) / 2)
-        sleep_midpoint = bedtime + length_of_sleep
-        print(f"After adjustment: {sleep_midpoint.strftime('%H:%M')}")
-
-        reference_time = datetime.strptime("22:00", "%H:%M")
-        difference = (sleep_midpoint - reference_time).total_seconds() / 60
-        print(f"time after 10: {difference}")
-
-        # Handle cases where time is before 10 PM
-        if difference < 0:
-            difference += 24 * 60  # Adjust to next day
-        if difference > 24 * 60:
-            difference -= 24 * 60  # Adjust to range 0-1440 (a single day)
-
-        return int(difference)
-    except ValueError:
-        raise ValueError("Invalid time format. Please enter in HH:MM format.")
-
-def run_saves(excel_output_path, sleep_dataset_path):
-    """Run the analysis and save the graphs."""
+    """Converts a bedtime in HH:MM format to the sleep midpoint in minutes after 10:00 PM."""
+    return create_sleep_model.convert_bedtime_to_minutes_after_10(time_str, total_sleep_time)
+
+class TaskCancelled(Exception):
+    """Raised inside a background task when it is cancelled."""
+
+
+def _run_task(function, args, messages, cancel_event):
+    """Runs a task in its worker thread or process and reports its progress and result through `messages`."""
+    def progress(message):
+        if cancel_event.is_set():
+            raise TaskCancelled()
+        messages.put(("progress", message))
+
     try:
-        ensure_results_directory()
-        first_dataset_analysis.run_full_data_analysis(excel_output_path, False, True)
-        second_dataset_analysis.run_full_sleep_analysis(sleep_dataset_path, False, True)
-    except(FileNotFoundError, ValueError, RuntimeError) as e:
-        print(f"Error: {e}")
+        result = function(*args, progress=progress)
+        messages.put(("cancelled", None) if cancel_event.is_set() else ("done", result))
+    except TaskCancelled:
+        messages.put(("cancelled", None))
+    except Exception as e:
+        messages.put(("error", e))
+
+
+class TaskRunner:
+    """
+    Runs the long jobs of the GUI (Excel build, saving graphs, training) in the background, one at a time.
+
+    The Tk main loop polls the running task with `after()`, shows its progress messages, and calls back on the main
+    thread when it ends. The action buttons are disabled while a task runs. A task runs in a thread or in a separate
+    process, and is cancelled at its next progress message so it can clean up (for example stop its workers and
+    record the figures already saved). A process which has not stopped `cancel_timeout_ms` later is terminated.
+    """
+    poll_interval_ms = 100
+    cancel_timeout_ms = 10_000
+
+    def __init__(self, root, buttons, cancel_button, status, progress_bar):
+        self.root = root
+        self.buttons = buttons
+        self.cancel_button = cancel_button
+        self.status = status
+        self.progress_bar = progress_bar
+        self.task = None
+
+    def run(self, name, function, args=(), on_done=None, on_error=None, in_process=False):
+        """Starts `function(*args, progress=...)` in the background, unless a task is already running."""
+        if self.task:
+            return
+        if in_process:
+            context = multiprocessing.get_context("spawn")
+            messages, cancel_event = context.Queue(), context.Event()
+            # Not a daemon, so the task can start its own worker processes (like the figure renderers)
+            worker = context.Process(target=_run_task, args=(function, args, messages, cancel_event))
+        else:
+            messages, cancel_event = queue.Queue(), threading.Event()
+            worker = threading.Thread(target=_run_task, args=(function, args, messages, cancel_event), daemon=True)
+        worker.start()
+        self.task = {"name": name, "worker": worker, "messages": messages, "cancel_event": cancel_event,
+                     "on_done": on_done, "on_error": on_error, "in_process": in_process}
+        self._set_busy(True, f"{name}...")
+        self.root.after(self.poll_interval_ms, self._poll)
+
+    def cancel(self):
+        """Cancels the running task."""
+        if not self.task:
+            return
+        self.task["cancel_event"].set()
+        self.status.set(f"Cancelling {self.task['name'].lower()}...")
+        if self.task["in_process"]:
+            task = self.task
+            self.root.after(self.cancel_timeout_ms, lambda: self._terminate(task))
+
+    def stop(self, timeout=5):
+        """Cancels the running task and waits for it to end, a process is terminated after `timeout` seconds."""
+        if not self.task:
+            return
+        task, self.task = self.task, None
+        task["cancel_event"].set()
+        task["worker"].join(timeout)
+        if task["in_process"] and task["worker"].is_alive():
+            task["worker"].terminate()
+
+    def _terminate(self, task):
+        """Terminates a cancelled process task which did not stop by itself."""
+        if self.task is task and task["worker"].is_alive():
+            task["worker"].terminate()
+            self._finish("cancelled", None)
+
+    def _poll(self):
+        """Handles the messages of the running task, and polls again until it ends."""
+        if not self.task:
+            return
+        while True:
+            try:
+                kind, content = self.task["messages"].get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                self.status.set(f"{self.task['name']}: {content}")
+            else:
+                self._finish(kind, content)
+                return
+        if self.task["in_process"] and not self.task["worker"].is_alive() and self.task["messages"].empty():
+            self._finish("error", RuntimeError(f"The task ended unexpectedly (exit code {self.task['worker'].exitcode})."))
+            return
+        self.root.after(self.poll_interval_ms, self._poll)
+
+    def _finish(self, kind, content):
+        """Re-enables the GUI and calls the task's callback."""
+        task, self.task = self.task, None
+        self._set_busy(False, {"done": f"{task['name']}: done", "cancelled": f"{task['name']}: cancelled",
+                               "error": f"{task['name']}: failed"}[kind])
+        if kind == "done" and task["on_done"]:
+            task["on_done"](content)
+        elif kind == "error":
+            if task["on_error"]:
+                task["on_error"](content)
+            else:
+                messagebox.showerror(task["name"], str(content))
+
+    def _set_busy(self, busy, status):
+        """Disables the action buttons and shows the progress bar while a task runs."""
+        for button in self.buttons:
+            button.state(["disabled"] if busy else ["!disabled"])
+        self.cancel_button.state(["!disabled"] if busy else ["disabled"])
+        if busy:
+            self.progress_bar.start()
+        else:
+            self.progress_bar.stop()
+        self.status.set(status)
+
+
+def run_saves(excel_output_path, sleep_dataset_path, progress=None, workers=None):
+    """Run the analysis and save the graphs, rendered in parallel processes."""
+    ensure_results_directory()
+    pipeline.save_figures(excel_output_path, sleep_dataset_path, workers, progress)
+
+def run_saves_headless(excel_output_path, sleep_dataset_path, progress=None):
+    """Saves the graphs with the non-interactive Agg backend, used by the Save Graph task in its own process."""
+    matplotlib.use("Agg")
+    run_saves(excel_output_path, sleep_dataset_path, progress)
 
 def run_shows(excel_output_path, sleep_dataset_path):
     """Run the analysis and show the data."""
@@ -55,44 +168,97 @@ def run_shows(excel_output_path, sleep_dataset_path):
         print(f"Error: {e}")
 
 
-def create_and_run_model(entries, sleep_dataset_path):
-    """Collect inputs from GUI, clean data, train the model, and make a prediction."""
+def read_user_inputs(entries):
+    """Collect the inputs from the GUI entries, converting the bedtime HH:MM to the sleep midpoint."""
+    user_inputs = []
+    total_sleep = 0
+    for feature, entry in zip(create_sleep_model.features, entries):
+        value = entry.get()
+        if feature == "midpoint_sleep":
+            # Convert bedtime HH:MM to midpoint minutes after 10 PM
+            value = convert_bedtime_to_minutes_after_10(value, total_sleep)
+        else:
+            value = float(value)
+        user_inputs.append(value)
+        # Save sleep time to calculate midpoint
+        if feature == "TotalSleepTime":
+            total_sleep = value
+    return user_inputs
+
+def predict_score(user_inputs, sleep_dataset_path, progress=None):
+    """Load the saved model (training it only if needed), and predict the score of the inputs."""
+    progress = progress or (lambda message: None)
+    progress("Loading the model")
+    # Load the model trained on the dataset, it is only trained once and then reused.
+    # The compiled model is loaded from its saved .npz without scikit-learn, it scales the inputs itself
+    # and predicts the same score as the sklearn model. A training reports its stages, where it can be cancelled
+    model = create_sleep_model.get_compiled_model(sleep_dataset_path, progress=progress)
+
+    # Predict using the trained model
+    return model.predict([user_inputs])[0]
+
+def create_and_run_model(tasks, entries, sleep_dataset_path):
+    """Collect inputs from GUI and predict their score in the background."""
     try:
-        # Collect user input from entry widgets
-        user_inputs = []
-        total_sleep = 0
-        for feature, entry in zip(create_sleep_model.features, entries):
-            value = entry.get()
-            if feature == "midpoint_sleep":
-                # Convert bedtime HH:MM to midpoint minutes after 10 PM
-                value = convert_bedtime_to_minutes_after_10(value, total_sleep)
-            else:
-                value = float(value)
-            user_inputs.append(value)
-            # Save sleep time to calculate midpoint
-            if feature == "TotalSleepTime":
-                total_sleep = value
-        # Load and prepare the dataset
-        data, scaler = create_sleep_model.clean_model_data(sleep_dataset_path)
-        model = create_sleep_model.train_model(data)
+        user_inputs = read_user_inputs(entries)
+    except ValueError as e:
+        messagebox.showerror("Input Error", f"Please enter valid inputs.\n{str(e)}")
+        return
 
-        # Create a DataFrame and scale the inputs using the trained scaler
-        user_data = pd.DataFrame([user_inputs], columns=create_sleep_model.features)
-        scaled_user_data = pd.DataFrame(scaler.transform(user_data), columns=create_sleep_model.features)
+    tasks.run(
+        "Predicting the score", predict_score, (user_inputs, sleep_dataset_path),
+        on_done=lambda prediction: messagebox.showinfo("Prediction Result", f"Predicted Score: {prediction:.2f}"),
+        on_error=show_prediction_error,
+    )
 
-        # Predict using the trained model
-        prediction = model.predict(scaled_user_data)[0]
+def show_prediction_error(error):
+    """Shows why a prediction failed: invalid inputs, or a missing dataset or model error."""
+    if isinstance(error, ValueError):
+        messagebox.showerror("Input Error", f"Please enter valid inputs.\n{str(error)}")
+    else:
+        messagebox.showerror("Prediction Error", f"Could not predict the score.\n{str(error)}")
+
+
+def train_model(sleep_dataset_path, progress=None):
+    """Train the model again on the dataset and replace the saved one."""
+    progress = progress or (lambda message: None)
+    progress("Training the model")
+    # Reports every training stage, a cancelled training stops there and keeps the saved model
+    create_sleep_model.get_model(sleep_dataset_path, retrain=True, progress=progress)
+
+def retrain_model(tasks, sleep_dataset_path):
+    """Train the model again in the background."""
+    tasks.run(
+        "Training the model", train_model, (sleep_dataset_path,),
+        on_done=lambda _: messagebox.showinfo("Model Trained", "The model was trained and saved."),
+        on_error=lambda e: messagebox.showerror("Training Error", f"Could not train the model.\n{str(e)}"),
+    )
 
-        # Display the prediction result
-        messagebox.showinfo("Prediction Result", f"Predicted Score: {prediction:.2f}")
 
-    except ValueError as e:
-        messagebox.showerror("Input Error", f"Please enter valid inputs.\n{str(e)}")
+def create_excel(tasks, excel_output_path):
+    """Build the Excel file in the background."""
+    tasks.run(
+        "Creating the Excel file", first_dataset_excel.build_excel, (excel_output_path,),
+        on_done=lambda _: messagebox.showinfo("Excel Created", f"The Excel file was saved to {excel_output_path}."),
+        on_error=lambda e: messagebox.showerror("Dataset not found", f"Please download dataset and place in data directory.\n{first_dataset_excel.dataset_url}\n{str(e)}"),
+    )
 
 
-def exit_application(root):
-    """Destroy the GUI on exit."""
+def save_graphs(tasks, excel_output_path, sleep_dataset_path):
+    """Save the graphs in a background process, which does not need the GUI's plotting backend."""
+    tasks.run(
+        "Saving the graphs", run_saves_headless, (excel_output_path, sleep_dataset_path),
+        on_done=lambda _: messagebox.showinfo("Graphs Saved", "The graphs were saved to the results directory."),
+        on_error=lambda e: messagebox.showerror("Error", str(e)),
+        in_process=True,
+    )
+
+
+def exit_application(root, tasks=None):
+    """Destroy the GUI on exit, after stopping the running task."""
     if messagebox.askyesno("Confirm Exit", "Are you sure you want to exit?"):
+        if tasks:
+            tasks.stop()
         root.destroy()
 
 def open_gui(excel_output_path, sleep_dataset_path):
@@ -157,10 +323,16 @@ def open_gui(excel_output_path, sleep_dataset_path):
 
     # Button for predicting score
     predict_button = ttk.Button(
-        root, text="Predict Score", command=lambda: create_and_run_model(entries, sleep_dataset_path)
+        root, text="Predict Score", command=lambda: create_and_run_model(tasks, entries, sleep_dataset_path)
     )
     predict_button.pack(pady=10)
 
+    # Button for training the model again
+    retrain_button = ttk.Button(
+        root, text="Retrain Model", command=lambda: retrain_model(tasks, sleep_dataset_path)
+    )
+    retrain_button.pack(pady=5)
+
     # Add a frame for buttons
     create_excel_frame = ttk.Frame(root, style="Custom.TFrame", padding=20)
     create_excel_frame.pack(fill="x", padx=20, pady=10)
@@ -190,23 +362,41 @@ def open_gui(excel_output_path, sleep_dataset_path):
     show_button.pack(side="left", padx=10, pady=10)
 
     save_button = ttk.Button(
-        button_frame, text="Save Graph", command=lambda: run_saves(excel_output_path, sleep_dataset_path), style="Custom.TButton", width=25
+        button_frame, text="Save Graph", command=lambda: save_graphs(tasks, excel_output_path, sleep_dataset_path), style="Custom.TButton", width=25
     )
     save_button.pack(side="right", padx=10, pady=10)
 
     create_excel_button = ttk.Button(
         create_excel_frame,
         text="Create Excel",
-        command=lambda: first_dataset_excel.build_excel(excel_output_path),
+        command=lambda: create_excel(tasks, excel_output_path),
         style="Custom.TButton",
         width=15,
     )
     create_excel_button.pack(side="left", padx=25, pady=10)
 
+    # Progress of the background tasks, with a button to cancel the running one
+    status_frame = ttk.Frame(root, padding=5)
+    status_frame.pack(fill="x", padx=20)
+
+    status = tk.StringVar(value="Ready")
+    status_label = ttk.Label(status_frame, textvariable=status, anchor="w")
+    status_label.pack(side="left", fill="x", expand=True)
+
+    cancel_button = ttk.Button(status_frame, text="Cancel", command=lambda: tasks.cancel())
+    cancel_button.pack(side="right", padx=5)
+
+    progress_bar = ttk.Progressbar(status_frame, mode="indeterminate", length=120)
+    progress_bar.pack(side="right", padx=5)
+
+    tasks = TaskRunner(root, [predict_button, retrain_button, show_button, save_button, create_excel_button],
+                       cancel_button, status, progress_bar)
+    cancel_button.state(["disabled"])
+
 
     # Add the Exit button at the bottom
     exit_button = ttk.Button(
-        root, text="Exit", command=lambda: exit_application(root), style="Custom.TButton", width=10
+        root, text="Exit", command=lambda: exit_application(root, tasks), style="Custom.TButton", width=10
     )
     exit_button.pack(side="right", padx=25, pady=15)
 
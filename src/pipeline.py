@@ -0,0 +1,33 @@
+'''
+The stages of the pipeline shared by the GUI and the command line (see `cli`), without any user interface.
+'''
+
+import pandas as pd
+
+import analysis_stats, cleaning, first_dataset_analysis, plotting, second_dataset_analysis
+
+
+def analysis_results(df, sleep_data):
+    """Returns the statistics of both analyses as one tidy results table (see `analysis_stats.result_columns`)."""
+    return pd.concat([first_dataset_analysis.correlation_results(df),
+                      second_dataset_analysis.regression_results(sleep_data)], ignore_index=True)
+
+
+def save_figures(excel_path, sleep_path, workers=None, progress=None, force=False, ci=plotting.regression_ci,
+                 statistics_formats=("csv", "json")):
+    """
+    Saves every graph of both analyses into results/, rendered in parallel processes, and the statistics table.
+
+    Graphs whose data and parameters did not change are skipped, unless `force` is True (see `plotting.render_figures`).
+    """
+    progress = progress or (lambda message: None)
+    progress("Loading the data")
+    df = pd.read_excel(excel_path)
+    sleep_data = cleaning.load_clean_sleep_data(sleep_path)
+    first_dataset_analysis.make_interactive_heat_map(df)
+    jobs = first_dataset_analysis.figure_jobs(df, ci) + second_dataset_analysis.figure_jobs(sleep_data)
+    paths = plotting.render_figures(jobs, workers, progress, force=force)
+
+    # The numbers shown in the graphs, as a table
+    analysis_stats.export_results(analysis_results(df, sleep_data), formats=statistics_formats)
+    return paths
@@ -1,7 +1,28 @@
 #     Imports
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import matplotlib
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+import numpy as np
 import seaborn as sns
-from scipy.stats import linregress
+
+import analysis_stats
+
+# Resolution of the saved figures
+save_dpi = 300
+
+# Size of the bootstrapped confidence interval drawn around the correlation plots' regression lines,
+# None draws the precomputed line only, without the (slower) bootstrap
+regression_ci = 95
+
+# Fingerprints of the saved figures, a figure whose data and parameters did not change is not rendered again.
+# Bump the version when the drawing code changes, to render every figure again
+figure_manifest_path = "results/manifest.json"
+figure_cache_version = 1
 
 
 def plot_correlation_matrix(data, name, show_choice, save_choice):
@@ -41,25 +62,20 @@ def plot_correlation_matrix(data, name, show_choice, save_choice):
     --------
     >>> plot_correlation_matrix(data, "Sleep Data", show_choice=True, save_choice=False)
     """
-    if "User" in data.columns: # Only use the numeric columns
-        data = data.drop(columns=["User"])
-    # Compute the correlation matrix
-    correlation_matrix = data.corr()
-
-    # Plot the heatmap
-    plt.figure(figsize=(12, 8))
-    sns.heatmap(correlation_matrix, annot=True, cmap="coolwarm", fmt=".2f")
-    plt.title(name +" Feature Correlation")
-    plt.tight_layout()
+    if save_choice and not show_choice: # Only saved, skipped if it is up to date
+        render_figures([correlation_matrix_job(data, name)])
+        return
+    plt.figure(figsize=figure_sizes["correlation_matrix"])
+    draw_correlation_matrix(plt.gca(), data, name)
     if save_choice:
-        plt.savefig(f"results/{name} Feature Correlation.png", dpi = 300)
+        plt.savefig(correlation_matrix_path(name), dpi = save_dpi)
     if show_choice:
         plt.show()
     else:
         plt.close()
 
 
-def plot_correlation(df, x, y, title=None, ax=None, show_choice=False, save_choice=False):
+def plot_correlation(df, x, y, title=None, ax=None, show_choice=False, save_choice=False, ci=regression_ci):
     """
     Creates a correlation plot between two variables
     
@@ -79,35 +95,27 @@ def plot_correlation(df, x, y, title=None, ax=None, show_choice=False, save_choi
         Whether to display the plot
     save_choice : bool
         Whether to save the plot
+    ci : int, optional
+        Size of the bootstrapped confidence interval of the regression line, None to skip the bootstrap
     
     Returns:
     --------
     matplotlib.axes.Axes
-        The axes object containing the plot
+        The axes object containing the plot (None if the plot was only saved, without an axes given)
     """
     # Create new figure if no axes provided
+    if ax is None and save_choice and not show_choice: # Only saved, skipped if it is up to date
+        render_figures([correlation_job(df, x, y, ci=ci)])
+        return None
     if ax is None:
-        plt.figure(figsize=(8, 6))
+        plt.figure(figsize=figure_sizes["correlation"])
         ax = plt.gca()
     
-    # Create the regression plot
-    sns.regplot(x=x, y=y, data=df, ax=ax)
-    
-    # Calculate and display correlation
-    correlation = df[[x, y]].corr().iloc[0, 1]
-    ax.text(0.05, 0.9, f"Correlation: {correlation:.2f}", 
-            transform=ax.transAxes, fontsize=12, 
-            bbox=dict(facecolor="white", alpha=0.5))
-    
-    # Set title
-    if title is None:
-        title = f"{y} vs {x}"
-    ax.set_title(title)
+    draw_correlation(ax, df, x, y, title, ci=ci)
     
     # Save if requested and it's a standalone plot
     if save_choice and ax.figure.number == plt.gcf().number:
-        filename = f"results/{y} vs {x} Correlation.png"
-        plt.savefig(filename, dpi=300)
+        plt.savefig(correlation_path(x, y), dpi=save_dpi)
     
     # Show if requested and it's a standalone plot
     if show_choice and ax.figure.number == plt.gcf().number:
@@ -129,37 +137,236 @@ def scatterplot_regression_by_group(data, group_col, x_col, y_col, show_choice,
     Returns:
     None
     """
-    plt.figure(figsize=(10, 6))
+    if save_choice and not show_choice: # Only saved, skipped if it is up to date
+        render_figures([regression_by_group_job(data, group_col, x_col, y_col)])
+        return
+    plt.figure(figsize=figure_sizes["regression_by_group"])
+    draw_regression_by_group(plt.gca(), data, group_col, x_col, y_col)
+
+    if save_choice:
+        plt.savefig(regression_by_group_path(x_col, y_col), dpi = save_dpi)
+    if show_choice:
+        plt.show()
+    else:
+        plt.close()
+
+
+# Drawing on a given axes, shared by the interactive functions above and the figure jobs below
+
+def draw_correlation_matrix(ax, data, name):
+    """Draws the heatmap of `plot_correlation_matrix` on `ax`."""
+    draw_correlation_heatmap(ax, analysis_stats.correlation_matrix(data), name)
+
+def draw_correlation_heatmap(ax, correlation_matrix, name):
+    """Draws the heatmap of a precomputed correlation matrix on `ax`."""
+    sns.heatmap(correlation_matrix, annot=True, cmap="coolwarm", fmt=".2f", ax=ax)
+    ax.set_title(name +" Feature Correlation")
+    ax.figure.tight_layout()
+
+def draw_correlation(ax, df, x, y, title=None, correlation=None, regression=None, ci=regression_ci):
+    """
+    Draws the regression plot of `plot_correlation` on `ax`.
+
+    The correlation and, without a confidence interval (`ci` None), the slope and intercept of the line are taken
+    from `correlation` and `regression` (a mapping with "slope" and "intercept") when given, otherwise from
+    `analysis_stats`. With a confidence interval, seaborn fits the line and bootstraps the interval.
+    """
+    if correlation is None:
+        correlation = analysis_stats.pair_correlations(df, [(x, y)])[(x, y)]
+
+    # Create the regression plot
+    if ci is None:
+        if regression is None:
+            regression = analysis_stats.pair_regressions(df, [(x, y)]).loc[(x, y)]
+        sns.regplot(x=x, y=y, data=df, ax=ax, fit_reg=False)
+        color = ax.collections[-1].get_facecolor()[0][:3]
+        x_range = np.linspace(df[x].min(), df[x].max(), 100)
+        ax.plot(x_range, regression["intercept"] + regression["slope"] * x_range, color=color, lw=plt.rcParams["lines.linewidth"] * 1.5)
+    else:
+        sns.regplot(x=x, y=y, data=df, ax=ax, ci=ci)
 
-    groups = data[group_col].unique()
-    palette = sns.color_palette("husl", len(groups))
+    # Display correlation
+    ax.text(0.05, 0.9, f"Correlation: {correlation:.2f}",
+            transform=ax.transAxes, fontsize=12,
+            bbox=dict(facecolor="white", alpha=0.5))
 
-    for group, color in zip(groups, palette, strict=False):
-        group_data = data[data[group_col] == group]
+    # Set title
+    if title is None:
+        title = f"{y} vs {x}"
+    ax.set_title(title)
 
-        # Perform linear regression
-        slope, intercept, r_value, p_value, std_err = linregress(group_data[x_col], group_data[y_col])
+def draw_regression_by_group(ax, data, group_col, x_col, y_col, regressions=None):
+    """
+    Draws the scatterplot and regression lines of `scatterplot_regression_by_group` on `ax`.
+
+    `regressions` holds the regression of every group (see `analysis_stats.group_regressions`), computed if not given.
+    """
+    if regressions is None:
+        regressions = analysis_stats.group_regressions(data, group_col, x_col, y_col)
+    groups = dict(tuple(data.groupby(group_col, sort=False, observed=True)))
+    palette = sns.color_palette("husl", len(regressions))
+
+    for (group, regression), color in zip(regressions.iterrows(), palette, strict=False):
+        group_data = groups[group]
 
         # Scatterplot
         sns.scatterplot(
-            data=group_data, x=x_col, y=y_col, color=color, label=f"Group {group}", s=50, alpha=0.4
+            data=group_data, x=x_col, y=y_col, color=color, label=f"Group {group}", s=50, alpha=0.4, ax=ax
         )
 
         # Regression line
         x_vals = group_data[x_col]
-        y_vals = intercept + slope * x_vals
-        plt.plot(x_vals, y_vals, color=color, linestyle="--", label=f"{group} Regression (r={r_value:.2f}, P value={p_value:.3f}), STD error={std_err:.2f}")
+        y_vals = regression["intercept"] + regression["slope"] * x_vals
+        ax.plot(x_vals, y_vals, color=color, linestyle="--", label=f"{group} Regression (r={regression['r']:.2f}, P value={regression['p']:.3f}), STD error={regression['std_err']:.2f}")
 
-    plt.title(x_col + " and " + y_col + "Scatter Plot", fontsize=16)
-    plt.xlabel(x_col, fontsize=12)
-    plt.ylabel(y_col, fontsize=12)
-    plt.legend(title="Groups", fontsize=10, title_fontsize=12)
-    plt.grid(True, linestyle="--", alpha=0.7)
-    plt.tight_layout()
+    ax.set_title(x_col + " and " + y_col + "Scatter Plot", fontsize=16)
+    ax.set_xlabel(x_col, fontsize=12)
+    ax.set_ylabel(y_col, fontsize=12)
+    ax.legend(title="Groups", fontsize=10, title_fontsize=12)
+    ax.grid(True, linestyle="--", alpha=0.7)
+    ax.figure.tight_layout()
 
-    if save_choice:
-        plt.savefig(f"results/{x_col} {y_col} Scatter Plot.png", dpi = 300)
-    if show_choice:
-        plt.show()
-    else:
-        plt.close()
+
+# Where each kind of figure is saved
+
+def correlation_matrix_path(name):
+    return f"results/{name} Feature Correlation.png"
+
+def correlation_path(x, y):
+    return f"results/{y} vs {x} Correlation.png"
+
+def regression_by_group_path(x_col, y_col):
+    return f"results/{x_col} {y_col} Scatter Plot.png"
+
+
+# Batch rendering: every saved figure is described as a job, and the jobs are rendered in parallel processes
+
+figure_sizes = {"correlation_matrix": (12, 8), "correlation": (8, 6), "regression_by_group": (10, 6)}
+figure_drawers = {"correlation_matrix": draw_correlation_heatmap, "correlation": draw_correlation,
+                  "regression_by_group": draw_regression_by_group}
+
+# A job's "args" are the figure's parameters, its "stats" the precomputed numbers it draws (derived from its data)
+
+def correlation_matrix_job(data, name):
+    """Describes the figure saved by `plot_correlation_matrix`, with its precomputed correlation matrix as data."""
+    return {"kind": "correlation_matrix", "path": correlation_matrix_path(name),
+            "data": analysis_stats.correlation_matrix(data), "args": {"name": name}, "stats": {}}
+
+def correlation_job(df, x, y, correlation=None, regression=None, ci=regression_ci):
+    """Describes the figure saved by `plot_correlation`, with only the two plotted columns of the data."""
+    if correlation is None:
+        correlation = analysis_stats.pair_correlations(df, [(x, y)])[(x, y)]
+    stats = {"correlation": float(correlation)}
+    if ci is None:
+        if regression is None:
+            regression = analysis_stats.pair_regressions(df, [(x, y)]).loc[(x, y)]
+        stats["regression"] = {"slope": float(regression["slope"]), "intercept": float(regression["intercept"])}
+    return {"kind": "correlation", "path": correlation_path(x, y), "data": df[[x, y]],
+            "args": {"x": x, "y": y, "ci": ci}, "stats": stats}
+
+def regression_by_group_job(data, group_col, x_col, y_col, regressions=None):
+    """Describes the figure saved by `scatterplot_regression_by_group`, with only the columns it uses."""
+    if regressions is None:
+        regressions = analysis_stats.group_regressions(data, group_col, x_col, y_col)
+    return {"kind": "regression_by_group", "path": regression_by_group_path(x_col, y_col),
+            "data": data[[group_col, x_col, y_col]], "args": {"group_col": group_col, "x_col": x_col, "y_col": y_col},
+            "stats": {"regressions": regressions}}
+
+def render_figure(job):
+    """Renders a figure job with the object-oriented Figure API (no pyplot state) and saves it, returns its path."""
+    figure = Figure(figsize=figure_sizes[job["kind"]])
+    figure_drawers[job["kind"]](figure.add_subplot(), job["data"], **job["args"], **job.get("stats", {}))
+    figure.savefig(job["path"], dpi=save_dpi)
+    return job["path"]
+
+def _use_agg_backend():
+    """Initializes a render process with the non-interactive Agg backend."""
+    matplotlib.use("Agg")
+
+def figure_fingerprint(kind, data, args):
+    """Returns the fingerprint of a figure: its kind, parameters, data, and the version of the drawing code."""
+    description = json.dumps({"kind": kind, "args": args, "size": figure_sizes.get(kind), "dpi": save_dpi,
+                              "version": figure_cache_version}, sort_keys=True, default=str)
+    return hashlib.sha256((description + analysis_stats.data_fingerprint(data)).encode()).hexdigest()
+
+def load_figure_manifest(manifest_path=figure_manifest_path):
+    """Loads the manifest of the saved figures (path -> kind and fingerprint), empty if it is missing or invalid."""
+    try:
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+def is_figure_current(manifest, path, fingerprint):
+    """Whether a figure was saved from the same data and parameters, and is still there."""
+    return manifest.get(path, {}).get("fingerprint") == fingerprint and os.path.exists(path)
+
+def record_figures(entries, manifest_path=figure_manifest_path):
+    """Adds the kind and fingerprint of newly saved figures (path -> entry) to the manifest."""
+    manifest = load_figure_manifest(manifest_path)
+    manifest.update(entries)
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    with open(manifest_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+
+def render_figures(jobs, workers=None, progress=None, manifest_path=figure_manifest_path, force=False):
+    """
+    Renders figure jobs in parallel worker processes and saves them, so a full save scales with the number of cores.
+
+    A figure whose fingerprint (data and parameters) matches the manifest and whose file exists is skipped.
+    The fingerprints are checked in this process, only the figures to render are sent to the workers.
+
+    Parameters:
+    jobs (list[dict]): The figures to render, created by the `*_job` functions.
+    workers (int, optional): Number of worker processes, by default one per core (and at most one per job).
+    progress (callable, optional): Called with a short message after every rendered figure.
+    manifest_path (str): The manifest of the saved figures, updated with the rendered ones.
+    force (bool): Render every figure, even the unchanged ones.
+
+    Returns:
+    list[str]: The paths of the figures, in the order of the jobs, whether they were rendered or skipped.
+    """
+    progress = progress or (lambda message: None)
+    manifest = load_figure_manifest(manifest_path)
+    fingerprints = {job["path"]: figure_fingerprint(job["kind"], job["data"], job["args"]) for job in jobs}
+    pending = [job for job in jobs if force or not is_figure_current(manifest, job["path"], fingerprints[job["path"]])]
+    if len(pending) < len(jobs):
+        progress(f"{len(jobs) - len(pending)} figures are up to date")
+    if not pending:
+        return [job["path"] for job in jobs]
+
+    for directory in {os.path.dirname(job["path"]) for job in pending}:
+        os.makedirs(directory or ".", exist_ok=True)
+    rendered = {}
+    try:
+        # Not worth starting processes for a single figure, and a daemon process is not allowed to start any
+        if len(pending) == 1 or multiprocessing.current_process().daemon:
+            for done, job in enumerate(pending, start=1):
+                rendered[render_figure(job)] = job["kind"]
+                progress(f"Saved {os.path.basename(job['path'])} ({done}/{len(pending)})")
+        else:
+            _render_in_processes(pending, workers, progress, rendered)
+    finally:
+        # The figures saved before an error or a cancellation are kept
+        record_figures({path: {"kind": kind, "fingerprint": fingerprints[path]} for path, kind in rendered.items()},
+                       manifest_path)
+    return [job["path"] for job in jobs]
+
+def _render_in_processes(jobs, workers, progress, rendered):
+    """Renders jobs in a process pool, adding the path and kind of every saved figure to `rendered`."""
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    kinds = {job["path"]: job["kind"] for job in jobs}
+
+    # Spawned workers do not inherit the parent's GUI, threads or pyplot state
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_use_agg_backend)
+    try:
+        futures = [executor.submit(render_figure, job) for job in jobs]
+        for done, future in enumerate(as_completed(futures), start=1):
+            path = future.result()
+            rendered[path] = kinds[path]
+            progress(f"Saved {os.path.basename(path)} ({done}/{len(jobs)})")
+    finally:
+        # Stops early (for example when cancelled) without rendering the remaining jobs
+        executor.shutdown(cancel_futures=True)
@@ -0,0 +1,208 @@
+'''
+A small local HTTP server around the sleep score model.
+
+The compiled model (see `compiled_forest`) is loaded once when the server starts, scikit-learn is not imported. Concurrent requests are grouped by a micro-batcher into a single
+`predict` call, and the latency of every request is recorded to report its p50/p99.
+
+Endpoints:
+- POST /predict: a single profile, a list of profiles, or {"instances": [...]}, returns {"predictions": [...]}.
+  A profile holds the GUI inputs: "TotalSleepTime" (hours), "bedtime_mssd", "bedtime" (HH:MM) and "daytime_sleep".
+  A numeric "midpoint_sleep" (minutes after 10:00 PM) can be given instead of "bedtime".
+- GET /stats: number of requests and batches, mean batch size and p50/p99 latency in milliseconds.
+- GET /health: {"status": "ok"}.
+'''
+
+import argparse
+import json
+import math
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+import create_sleep_model
+
+
+def _finite_input(inputs, name):
+    """Returns an input as a number, raises ValueError if it is NaN or infinite."""
+    value = float(inputs[name])
+    if not math.isfinite(value):
+        raise ValueError(f"{name} must be a finite number")
+    return value
+
+def profile_from_inputs(inputs):
+    """Converts the inputs of one profile, as entered in the GUI, to the values of the model's features."""
+    try:
+        total_sleep = _finite_input(inputs, "TotalSleepTime")
+        if "midpoint_sleep" in inputs:
+            midpoint = _finite_input(inputs, "midpoint_sleep")
+        else:
+            midpoint = create_sleep_model.convert_bedtime_to_minutes_after_10(str(inputs["bedtime"]), total_sleep)
+        return [total_sleep, _finite_input(inputs, "bedtime_mssd"), midpoint, _finite_input(inputs, "daytime_sleep")]
+    except KeyError as e:
+        raise ValueError(f"Missing input: {e.args[0]}") from None
+    except TypeError as e:
+        raise ValueError(str(e)) from None
+
+
+class MicroBatcher:
+    """Groups the profiles of concurrent requests into batches scored with a single `predict` call."""
+
+    def __init__(self, model, max_batch=256, max_wait_ms=2.0, latency_window=10_000):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.latencies = deque(maxlen=latency_window)
+        self.request_count = 0
+        self.batch_count = 0
+        self.batched_requests = 0
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def predict(self, profiles):
+        """Queues the profiles of one request and waits for their predictions."""
+        future = Future()
+        self.requests.put((profiles, future))
+        return future.result()
+
+    def record_latency(self, seconds):
+        """Records the latency of a finished request."""
+        with self.lock:
+            self.latencies.append(seconds)
+            self.request_count += 1
+
+    def stats(self):
+        """Returns the request, batch and latency statistics."""
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            mean_batch = self.batched_requests / self.batch_count if self.batch_count else 0
+            stats = {"requests": self.request_count, "batches": self.batch_count, "mean_requests_per_batch": mean_batch}
+        if len(latencies):
+            stats["p50_ms"] = float(np.percentile(latencies, 50))
+            stats["p99_ms"] = float(np.percentile(latencies, 99))
+        return stats
+
+    def _next_batch(self):
+        """Waits for a request, then collects the ones arriving within `max_wait` up to `max_batch` profiles."""
+        batch = [self.requests.get()]
+        rows = len(batch[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+            rows += len(batch[-1][0])
+        return batch
+
+    def _run(self):
+        """Scores the queued requests batch by batch."""
+        while True:
+            batch = self._next_batch()
+            profiles = [profile for request_profiles, _ in batch for profile in request_profiles]
+            try:
+                predictions = self.model.predict(np.array(profiles, dtype=float))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            with self.lock:
+                self.batch_count += 1
+                self.batched_requests += len(batch)
+            start = 0
+            for request_profiles, future in batch:
+                future.set_result(predictions[start:start + len(request_profiles)].tolist())
+                start += len(request_profiles)
+
+
+class PredictionServer(ThreadingHTTPServer):
+    """A threading HTTP server accepting many simultaneous connections (socketserver's default backlog is 5)."""
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """Handles the HTTP requests, the batcher is set on the server."""
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/stats":
+            self._send_json(200, self.server.batcher.stats())
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send_json(404, {"error": "Not found"})
+            return
+        start = time.perf_counter()
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            instances = body.get("instances", [body]) if isinstance(body, dict) else body
+            if not isinstance(instances, list):
+                raise ValueError("Expected a profile, a list of profiles or {\"instances\": [...]}")
+            profiles = [profile_from_inputs(inputs) for inputs in instances]
+        except (ValueError, AttributeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        try:
+            predictions = self.server.batcher.predict(profiles) if profiles else []
+        except Exception as e:
+            self._send_json(500, {"error": f"Prediction failed: {e}"})
+            return
+        self.server.batcher.record_latency(time.perf_counter() - start)
+        self._send_json(200, {"predictions": predictions})
+
+    def log_message(self, format, *args):
+        """Requests are not logged one by one, see /stats instead."""
+
+    def _send_json(self, status, content):
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def create_server(sleep_dataset_path="data/cmu-sleep.csv", host="127.0.0.1", port=8000, max_batch=256,
+                  max_wait_ms=2.0, directory=create_sleep_model.artifact_dir):
+    """Loads the persisted compiled model once and creates the server (port 0 picks a free port)."""
+    model = create_sleep_model.get_compiled_model(sleep_dataset_path, directory)
+    server = PredictionServer((host, port), PredictionHandler)
+    server.batcher = MicroBatcher(model, max_batch, max_wait_ms)
+    return server
+
+
+def main(argv=None):
+    """Command line entry point of the prediction server."""
+    parser = argparse.ArgumentParser(description="Serve the sleep score model over HTTP.")
+    parser.add_argument("--dataset", default="data/cmu-sleep.csv", help="sleep dataset the model is trained on")
+    parser.add_argument("--models", default=create_sleep_model.artifact_dir, help="directory of the saved models")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch", type=int, default=256, help="most profiles scored per predict call")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="how long a batch waits for more requests")
+    args = parser.parse_args(argv)
+
+    server = create_server(args.dataset, args.host, args.port, args.max_batch, args.max_wait_ms, args.models)
+    print(f"Serving predictions on http://{args.host}:{server.server_address[1]}/predict")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
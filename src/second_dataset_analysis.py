@@ -1,5 +1,11 @@
-import cleaning, plotting
+import pandas as pd
+import analysis_stats, cleaning, plotting
 
+# Columns of the sleep correlation heatmap
+heatmap_columns = ["study", "demo_firstgen", "bedtime_mssd", "TotalSleepTime", "midpoint_sleep",
+                   "frac_nights_with_data", "daytime_sleep", "score_scaled"]
+# Sleep metrics plotted against the score, grouped by study
+scatter_columns = ["midpoint_sleep", "bedtime_mssd", "TotalSleepTime"]
 
 
 def create_new_features(data):
@@ -15,18 +21,7 @@ def create_new_features(data):
     Returns:
     pd.DataFrame: The DataFrame with new features added.
     """
-    # Add a weighted score based on 'term_gpa'
-    data["score"] = data["term_gpa"].transform(lambda x: 25 * x)
-
-    # Scale 'term_gpa' within each 'study' group
-    data["score_scaled"] = data.groupby("study")["term_gpa"].transform(
-        lambda x: 100 * (x - x.min()) / (x.max() - x.min())
-    )
-
-    # Transform 'midpoint_sleep' from minutes to hours in 24-hour format
-    data["midpoint_sleep_hour"] = data["midpoint_sleep"].transform(lambda x: ((x / 60) + 23) % 24)
-
-    return data
+    return cleaning.add_score_features(data)
 
 
 def create_sleep_heatmap(sleep_data, show_choice, save_choice):
@@ -60,9 +55,7 @@ def create_sleep_heatmap(sleep_data, show_choice, save_choice):
     None
         The function triggers plotting but does not return any value.
     """
-    columns_to_keep = ["study", "demo_firstgen", "bedtime_mssd", "TotalSleepTime", "midpoint_sleep",
-                        "frac_nights_with_data", "daytime_sleep", "score_scaled"]
-    sleep_data_copy = sleep_data[columns_to_keep]
+    sleep_data_copy = sleep_data[heatmap_columns]
     plotting.plot_correlation_matrix(sleep_data_copy , "Grades Score", show_choice, save_choice)
 
 def create_sleep_scatter_plots(sleep_data, show_choice, save_choice):
@@ -91,9 +84,47 @@ def create_sleep_scatter_plots(sleep_data, show_choice, save_choice):
     None
         The function triggers plotting but does not return any value.
     """
-    plotting.scatterplot_regression_by_group(sleep_data, "study", "midpoint_sleep", "score", show_choice, save_choice)
-    plotting.scatterplot_regression_by_group(sleep_data, "study", "bedtime_mssd", "score", show_choice, save_choice)
-    plotting.scatterplot_regression_by_group(sleep_data, "study", "TotalSleepTime", "score", show_choice, save_choice)
+    for column in scatter_columns:
+        plotting.scatterplot_regression_by_group(sleep_data, "study", column, "score", show_choice, save_choice)
+
+
+def figure_jobs(sleep_data):
+    """
+    Describes the figures saved by the sleep analysis (the heatmap and the scatter plots),
+    to be rendered in parallel with `plotting.render_figures`.
+
+    Parameters:
+    -----------
+    sleep_data : DataFrame
+        The cleaned sleep data, with the new features.
+
+    Returns:
+    --------
+    list[dict]
+        The figure jobs.
+    """
+    jobs = [plotting.correlation_matrix_job(sleep_data[heatmap_columns], "Grades Score")]
+    jobs += [plotting.regression_by_group_job(sleep_data, "study", column, "score") for column in scatter_columns]
+    return jobs
+
+def regression_results(sleep_data):
+    """
+    Returns the statistics of the scatter plots' regressions (r, p value, slope, intercept, std error and n of
+    every study) as rows of the tidy results table.
+
+    Parameters:
+    -----------
+    sleep_data : DataFrame
+        The cleaned sleep data, with the new features.
+
+    Returns:
+    --------
+    DataFrame
+        One row per sleep metric and study, with the columns of `analysis_stats.result_columns`.
+    """
+    tables = [analysis_stats.tidy_regressions(analysis_stats.group_regressions(sleep_data, "study", column, "score"),
+                                              "Sleep", column, "score") for column in scatter_columns]
+    return pd.concat(tables, ignore_index=True)
 
 def run_full_sleep_analysis(sleep_dataset_path, show_choice, save_choice):
     """
@@ -112,10 +143,9 @@ def run_full_sleep_analysis(sleep_dataset_path, show_choice, save_choice):
 
     Workflow Steps:
     ---------------
-    1. Clean the sleep data using the `clean_sleep_data` function.
-    2. Generate new features necessary for analysis using `create_new_features`.
-    3. Create a heatmap showing correlations between sleep metrics and the target score.
-    4. Create scatter plots showing regression lines between sleep metrics and scores, grouped by study.
+    1. Load the cleaned sleep data, with the new features needed for the analysis, using `cleaning.load_clean_sleep_data`.
+    2. Create a heatmap showing correlations between sleep metrics and the target score.
+    3. Create scatter plots showing regression lines between sleep metrics and scores, grouped by study.
 
     Returns:
     --------
@@ -123,7 +153,6 @@ def run_full_sleep_analysis(sleep_dataset_path, show_choice, save_choice):
         The function orchestrates the analysis pipeline but does not return any value.
     """
     if show_choice or save_choice:
-        sleep_data = cleaning.clean_sleep_data(sleep_dataset_path)
-        create_new_features(sleep_data)
+        sleep_data = cleaning.load_clean_sleep_data(sleep_dataset_path)
         create_sleep_heatmap(sleep_data, show_choice, save_choice)
         create_sleep_scatter_plots(sleep_data, show_choice, save_choice)
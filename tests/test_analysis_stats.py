@@ -0,0 +1,82 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import linregress
+
+# Add the src directory to sys.path dynamically
+repo_root = os.path.dirname(os.path.abspath(__file__))
+src_path = os.path.join(repo_root, "..", "src")
+sys.path.append(src_path)
+import analysis_stats
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=60)
+    return pd.DataFrame({
+        "User": [f"u{i:02d}" for i in range(60)],
+        "study": np.repeat([3, 1, 2], 20),
+        "x": x,
+        "y": 2 * x + rng.normal(size=60),
+        "z": np.where(np.arange(60) % 7 == 0, np.nan, rng.normal(size=60)),
+    })
+
+def as_list(regression):
+    return [regression["slope"], regression["intercept"], regression["r"], regression["p"], regression["std_err"]]
+
+def test_group_regressions_match_linregress(data):
+    table = analysis_stats.group_regressions(data, "study", "x", "y")
+    assert list(table.index) == [3, 1, 2]  # Order of first appearance
+    for study, regression in table.iterrows():
+        group = data[data["study"] == study]
+        expected = linregress(group["x"], group["y"])
+        assert as_list(regression) == pytest.approx(
+            [expected.slope, expected.intercept, expected.rvalue, expected.pvalue, expected.stderr], rel=1e-9)
+        assert regression["n"] == 20
+
+def test_pair_statistics_use_complete_rows(data):
+    pairs = [("x", "y"), ("z", "y")]
+    table = analysis_stats.pair_regressions(data, pairs)
+    complete = data[["z", "y"]].dropna()
+    expected = linregress(complete["z"], complete["y"])
+    assert as_list(table.loc[("z", "y")]) == pytest.approx(
+        [expected.slope, expected.intercept, expected.rvalue, expected.pvalue, expected.stderr], rel=1e-9)
+    assert table.loc[("z", "y"), "n"] == len(complete)
+
+    correlations = analysis_stats.pair_correlations(data, pairs)
+    assert correlations[("z", "y")] == pytest.approx(data[["z", "y"]].corr().iloc[0, 1], rel=1e-12)
+
+def test_pair_correlations_share_the_correlation_matrix(data, monkeypatch):
+    monkeypatch.setattr(analysis_stats, "_statistics_memo", {})
+    analysis_stats.pair_correlations(data, [("x", "y"), ("z", "y")])
+    analysis_stats.correlation_matrix(data)
+    assert len(analysis_stats._statistics_memo) == 1
+
+def test_statistics_are_cached_by_content(data, monkeypatch):
+    monkeypatch.setattr(analysis_stats, "_statistics_memo", {})
+    first = analysis_stats.correlation_matrix(data)
+    assert "User" not in first.columns
+    first.iloc[0, 0] = 5  # Callers get a copy
+    assert analysis_stats.correlation_matrix(data.copy()).iloc[0, 0] == 1
+    assert len(analysis_stats._statistics_memo) == 1
+    analysis_stats.correlation_matrix(data.assign(y=data["y"] + 1))
+    assert len(analysis_stats._statistics_memo) == 2
+
+def test_tidy_results_export(data, tmp_path):
+    results = pd.concat([
+        analysis_stats.tidy_regressions(analysis_stats.pair_regressions(data, [("x", "y")]), "pairs"),
+        analysis_stats.tidy_regressions(analysis_stats.group_regressions(data, "study", "x", "y"), "groups", "x", "y"),
+    ], ignore_index=True)
+    assert list(results.columns) == analysis_stats.result_columns
+    assert results["group"].tolist()[1:] == ["3", "1", "2"] and pd.isna(results["group"][0])
+
+    paths = analysis_stats.export_results(results, str(tmp_path / "statistics"), ("csv", "parquet", "json"))
+    assert [os.path.basename(path) for path in paths] == ["statistics.csv", "statistics.parquet", "statistics.json"]
+    pd.testing.assert_frame_equal(pd.read_parquet(paths[1]), results)
+    # CSV and JSON read the group back as numbers
+    assert pd.read_csv(paths[0])["r"].tolist() == pytest.approx(results["r"].tolist())
+    assert pd.read_json(paths[2])["slope"].tolist() == pytest.approx(results["slope"].tolist())
+    with pytest.raises(ValueError):
+        analysis_stats.export_results(results, str(tmp_path / "statistics"), ("xlsx",))
@@ -53,6 +53,20 @@ def test_drop_blanks_and_nulls(sample_df):
     assert ' ' not in result['A'].values
     assert '' not in result['B'].values
 
+def test_replace_blanks_matches_regex_replace():
+    data = pd.DataFrame({
+        'text': ['a', ' ', '', '\t\n', None],
+        'mixed': [1, '  ', 'b', 2.5, ''],
+        'numbers': [1.0, 2.0, np.nan, 4.0, 5.0],
+        'objects': pd.Series([1, 2, 3, 4, 5], dtype=object)
+    })
+    expected = data.replace(r"^\s*$", np.nan, regex=True)
+    result = cleaning.replace_blanks(data)
+
+    # replace() also downcasts untouched object columns, which is deprecated in pandas, so dtypes are not compared
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    assert data.loc[1, 'text'] == ' '  # The input is not modified
+
 # Tests for extract_participant
 def test_extract_participant_valid():
     filename = "data_u123.json"
@@ -64,6 +78,60 @@ def test_extract_participant_no_match():
     with pytest.raises(IndexError):
         cleaning.extract_participant(filename)
 
+def test_clean_sleep_data_compact_dtypes(sample_sleep_data):
+    result = cleaning.clean_sleep_data(sample_sleep_data)
+
+    # Check that 'cohort' is skipped, outliers are removed and the schema dtypes are applied
+    assert 'cohort' not in result.columns
+    assert len(result) == 2
+    assert result['bedtime_mssd'].dtype == np.float32
+    assert result['daytime_sleep'].dtype == np.float32
+
+def test_iter_clean_sleep_chunks_matches_full_clean(tmp_path):
+    sleep_path = os.path.join(repo_root, "..", "data", "cmu-sleep.csv")
+    expected = cleaning.clean_sleep_data(sleep_path).reset_index(drop=True)
+
+    chunks = list(cleaning.iter_clean_sleep_chunks(sleep_path, chunksize=100))
+    assert len(chunks) > 1
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), expected)
+
+    output_path = tmp_path / "clean.parquet"
+    rows = cleaning.clean_sleep_data_to_parquet(sleep_path, str(output_path), chunksize=100)
+    assert rows == len(expected)
+    pd.testing.assert_frame_equal(pd.read_parquet(output_path), expected)
+
+    pruned = pd.concat(cleaning.iter_clean_sleep_chunks(sleep_path, columns=["study", "TotalSleepTime"]))
+    assert list(pruned.columns) == ["study", "TotalSleepTime"]
+    assert len(pruned) >= len(expected)  # Blanks in the skipped columns do not drop rows
+
+def test_load_clean_sleep_data_memo_and_disk_cache(sample_sleep_data, tmp_path, monkeypatch):
+    monkeypatch.setattr(cleaning, "_clean_sleep_memo", {})
+    clean_sleep_data = cleaning.clean_sleep_data
+    cache_dir = tmp_path / "cache"
+    df = pd.read_csv(sample_sleep_data)
+    df['study'] = [1, 2, 2, 1]
+    df['term_gpa'] = [3.0, 4.0, 2.0, 3.5]
+    df['midpoint_sleep'] = [300, 360, 420, 480]
+    df.to_csv(sample_sleep_data, index=False)
+
+    first = cleaning.load_clean_sleep_data(sample_sleep_data, cache_dir=str(cache_dir))
+    assert first['score_scaled'].tolist() == [0.0, 100.0]  # Scaled within study 1, after removing the outliers
+    assert len(os.listdir(cache_dir)) == 1
+
+    # Served from memory, then from disk, without cleaning the file again
+    first['score'] = 0
+    monkeypatch.setattr(cleaning, "clean_sleep_data", lambda *args, **kwargs: pytest.fail("cleaned twice"))
+    assert cleaning.load_clean_sleep_data(sample_sleep_data, cache_dir=str(cache_dir))['score'].tolist() == [75.0, 87.5]
+    monkeypatch.setattr(cleaning, "_clean_sleep_memo", {})
+    assert len(cleaning.load_clean_sleep_data(sample_sleep_data, cache_dir=str(cache_dir))) == 2
+
+    # A new version of the cleaning code does not use the cached file
+    monkeypatch.setattr(cleaning, "clean_sleep_data", clean_sleep_data)
+    monkeypatch.setattr(cleaning, "_clean_sleep_memo", {})
+    monkeypatch.setattr(cleaning, "sleep_cache_version", cleaning.sleep_cache_version + 1)
+    assert len(cleaning.load_clean_sleep_data(sample_sleep_data, cache_dir=str(cache_dir))) == 2
+    assert len(os.listdir(cache_dir)) == 2
+
 def test_clean_sleep_data_missing_columns(tmp_path):
     # Create DataFrame without optional columns
     df = pd.DataFrame({
@@ -94,6 +162,26 @@ def test_clean_sleep_data_with_invalid_values(tmp_path):
     assert all(result['bedtime_mssd'].notna())
     assert all(result['daytime_sleep'].notna())
 
+def test_clean_sleep_data_with_invalid_integers(tmp_path):
+    # A fractional and an overflowing value in integer columns, without any text
+    df = pd.DataFrame({
+        'subject_id': [1, 2, 3e9, 4],
+        'term_units': [12, 12.5, 15, 16],
+        'bedtime_mssd': [1.5, 2.0, 3.0, 2.5],
+    })
+    file_path = tmp_path / "test_invalid_integers.csv"
+    df.to_csv(file_path, index=False)
+
+    typed = cleaning.read_sleep_csv(str(file_path))
+    assert str(typed['subject_id'].dtype) == "Int32"
+    assert typed['subject_id'].isna().tolist() == [False, False, True, False]
+    assert typed['term_units'].isna().tolist() == [False, True, False, False]
+
+    result = cleaning.clean_sleep_data(str(file_path))
+    assert result['subject_id'].tolist() == [1, 4]  # The rows with invalid values are removed
+    streamed = pd.concat(cleaning.iter_clean_sleep_chunks(str(file_path), chunksize=2))
+    assert streamed['subject_id'].tolist() == [1, 4]
+
 
 class PyTestReporter:
     @pytest.hookimpl(hookwrapper=True)
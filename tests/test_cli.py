@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add the src directory to sys.path dynamically
+repo_root = os.path.dirname(os.path.abspath(__file__))
+src_path = os.path.join(repo_root, "..", "src")
+sys.path.append(src_path)
+import cli
+import first_dataset_analysis
+
+sleep_dataset_path = os.path.join(repo_root, "..", "data", "cmu-sleep.csv")
+
+@pytest.fixture
+def excel_path(tmp_path):
+    """An Excel file with every column of the plotted correlations."""
+    rng = np.random.default_rng(0)
+    columns = sorted({column for pair in first_dataset_analysis.correlations for column in pair})
+    df = pd.DataFrame(rng.normal(size=(20, len(columns))), columns=columns)
+    df.insert(0, "User", [f"u{i:02d}" for i in range(20)])
+    path = tmp_path / "output.xlsx"
+    df.to_excel(path, index=False)
+    return str(path)
+
+def test_cli_does_not_import_tkinter():
+    code = "import sys, cli; cli.create_parser(); sys.exit('tkinter' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], cwd=src_path).returncode == 0
+
+def test_analyze_exports_the_statistics(excel_path, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # The cleaned data is cached in the temporary data/cache
+    output = str(tmp_path / "statistics")
+    assert cli.main(["analyze", "--excel", excel_path, "--dataset", sleep_dataset_path, "--output", output,
+                     "--formats", "csv", "json"]) == 0
+    results = pd.read_csv(output + ".csv")
+    counts = results["analysis"].value_counts()
+    assert counts["Students life"] == len(first_dataset_analysis.correlations)
+    assert counts["Sleep"] % 3 == 0  # Every study for each of the 3 sleep metrics
+    assert os.path.exists(output + ".json")
+
+def test_plot_saves_the_figures_in_a_fresh_directory(excel_path, tmp_path, monkeypatch):
+    work_dir = tmp_path / "fresh"
+    work_dir.mkdir()
+    monkeypatch.chdir(work_dir)
+    assert cli.main(["plot", "--excel", excel_path, "--dataset", os.path.abspath(sleep_dataset_path), "--no-ci",
+                     "--workers", "2"]) == 0
+    saved = os.listdir(work_dir / "results")
+    assert first_dataset_analysis.interactive_heat_map_path.split("/")[-1] in saved
+    assert "statistics.csv" in saved
+    assert len([name for name in saved if name.endswith(".png")]) > 2
+
+def test_missing_file_is_reported(tmp_path, capsys):
+    assert cli.main(["analyze", "--excel", str(tmp_path / "missing.xlsx")]) == 1
+    assert "Error" in capsys.readouterr().err
+
+def test_missing_column_is_reported(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    excel_path = str(tmp_path / "output.xlsx")
+    pd.DataFrame({"User": ["u00"], "gpa_13s": [80.0]}).to_excel(excel_path, index=False)
+    assert cli.main(["analyze", "--excel", excel_path, "--dataset", sleep_dataset_path]) == 1
+    assert "Error: Missing column or key" in capsys.readouterr().err
@@ -0,0 +1,136 @@
+import json
+import os
+import sys
+import pytest
+import numpy as np
+import pandas as pd
+
+# Add the src directory to sys.path dynamically
+repo_root = os.path.dirname(os.path.abspath(__file__))
+src_path = os.path.join(repo_root, "..", "src")
+sys.path.append(src_path)
+import compiled_forest
+import create_sleep_model
+
+sleep_dataset_path = os.path.join(repo_root, "..", "data", "cmu-sleep.csv")
+small_params = {"n_estimators": 5, "max_depth": 4, "random_state": 42}
+
+# Fixtures
+@pytest.fixture
+def artifact_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(create_sleep_model, "_loaded_artifacts", {})
+    monkeypatch.chdir(tmp_path)  # The cleaned data is cached in the temporary data/cache
+    return str(tmp_path / "models")
+
+def test_get_model_trains_once_and_saves_artifact(artifact_dir, monkeypatch):
+    model, scaler = create_sleep_model.get_model(sleep_dataset_path, artifact_dir, small_params)
+    assert sorted(os.path.splitext(name)[1] for name in os.listdir(artifact_dir)) == [".joblib", ".json", ".npz"]
+
+    # Later calls reuse the model, first from this process and then from the saved artifact
+    monkeypatch.setattr(create_sleep_model, "fit_and_evaluate", lambda *args: pytest.fail("trained twice"))
+    assert create_sleep_model.get_model(sleep_dataset_path, artifact_dir, small_params)[0] is model
+    monkeypatch.setattr(create_sleep_model, "_loaded_artifacts", {})
+    loaded_model, loaded_scaler = create_sleep_model.get_model(sleep_dataset_path, artifact_dir, small_params)
+
+    user_data = pd.DataFrame([[7.0, 0.5, 300.0, 20.0]], columns=create_sleep_model.features)
+    assert loaded_model.predict(loaded_scaler.transform(user_data)) == pytest.approx(model.predict(scaler.transform(user_data)))
+
+def test_get_model_retrain(artifact_dir):
+    model, _ = create_sleep_model.get_model(sleep_dataset_path, artifact_dir, small_params)
+    retrained, _ = create_sleep_model.get_model(sleep_dataset_path, artifact_dir, small_params, retrain=True)
+    assert retrained is not model
+    assert create_sleep_model.get_model(sleep_dataset_path, artifact_dir, small_params)[0] is retrained
+
+def test_score_file_matches_single_predictions(artifact_dir, tmp_path, monkeypatch):
+    profiles = pd.DataFrame({
+        "TotalSleepTime": [7.0, 5.5, 8.5],
+        "bedtime_mssd": [0.5, 2.0, 0.1],
+        "midpoint_sleep": [300.0, 420.0, 250.0],
+        "daytime_sleep": [20.0, 90.0, 5.0],
+    })
+    input_path = tmp_path / "profiles.csv"
+    output_path = tmp_path / "predictions.parquet"
+    profiles.to_csv(input_path, index=False)
+    model, scaler = create_sleep_model.get_model(sleep_dataset_path, artifact_dir, small_params)
+
+    # The saved model used by score_file is the small one trained above
+    monkeypatch.setattr(create_sleep_model, "model_params", small_params)
+    stats = create_sleep_model.score_file(str(input_path), str(output_path), sleep_dataset_path, chunksize=2,
+                                          directory=artifact_dir)
+    assert stats["rows"] == 3
+
+    predictions = pd.read_parquet(output_path)["predicted_score_scaled"]
+    for index, row in profiles.iterrows():
+        single = model.predict(pd.DataFrame(scaler.transform(row.to_frame().T), columns=create_sleep_model.features))
+        assert predictions[index] == pytest.approx(single[0])
+
+def test_search_and_save_model_persists_metrics(artifact_dir):
+    grid = {"n_estimators": [5, 10], "max_depth": [3]}
+    artifact = create_sleep_model.search_and_save_model(sleep_dataset_path, artifact_dir, grid, folds=3, time_budget=0)
+
+    # A zero time budget still tries one candidate, and stops before the second
+    search_metrics = artifact["metadata"]["metrics"]
+    assert search_metrics["candidates_tried"] == 1
+    assert search_metrics["stopped_early"]
+    assert search_metrics["best_params"] == {"n_estimators": 5, "max_depth": 3, "random_state": 42}
+
+    metadata_file = [name for name in os.listdir(artifact_dir) if name.endswith(".json")][0]
+    with open(os.path.join(artifact_dir, metadata_file)) as file:
+        assert json.load(file)["metrics"]["cv_mae"] == pytest.approx(search_metrics["cv_mae"])
+    assert create_sleep_model.get_model(sleep_dataset_path, artifact_dir, search_metrics["best_params"])[0].n_estimators == 5
+
+def test_search_uses_every_core():
+    assert create_sleep_model._split_jobs(16, 5) == (5, 4)  # More cores than folds, the trees get the rest
+    assert create_sleep_model._split_jobs(8, 5) == (5, 2)
+    assert create_sleep_model._split_jobs(4, 5) == (4, 1)
+    assert create_sleep_model._split_jobs(1, 5) == (1, 1)
+
+def test_compiled_model_matches_sklearn(artifact_dir):
+    model, scaler = create_sleep_model.get_model(sleep_dataset_path, artifact_dir, small_params)
+    data, _ = create_sleep_model.clean_model_data(sleep_dataset_path)
+    profiles = data[create_sleep_model.features].copy()
+    profiles[create_sleep_model.features] = scaler.inverse_transform(profiles)
+    expected = create_sleep_model.predict_batch(model, scaler, profiles)
+
+    compiled = create_sleep_model.get_compiled_model(sleep_dataset_path, artifact_dir, small_params)
+    np.testing.assert_allclose(compiled.predict(profiles), expected, rtol=1e-12)
+
+    # The trees are summed in the same order as a single threaded forest
+    single_threaded = create_sleep_model.predict_batch(model.set_params(n_jobs=1), scaler, profiles)
+    assert (compiled.predict(profiles) == single_threaded).all()
+
+    # The saved .npz gives the same predictions without the sklearn model
+    saved_path = [name for name in os.listdir(artifact_dir) if name.endswith(".npz")][0]
+    loaded = compiled_forest.load_compiled_forest(os.path.join(artifact_dir, saved_path))
+    np.testing.assert_allclose(loaded.predict(profiles.to_numpy()[:1]), expected[:1], rtol=1e-12)
+
+def test_compiled_model_is_loaded_from_npz_and_replaced_when_retrained(artifact_dir, monkeypatch):
+    compiled = create_sleep_model.get_compiled_model(sleep_dataset_path, artifact_dir, small_params)
+    monkeypatch.setattr(create_sleep_model, "_loaded_artifacts", {})
+    monkeypatch.setattr(create_sleep_model, "load_model_artifact", lambda path: pytest.fail("loaded the sklearn model"))
+    loaded = create_sleep_model.get_compiled_model(sleep_dataset_path, artifact_dir, small_params)
+    assert (loaded.threshold == compiled.threshold).all()
+
+    create_sleep_model.get_model(sleep_dataset_path, artifact_dir, small_params, retrain=True)
+    assert create_sleep_model.get_compiled_model(sleep_dataset_path, artifact_dir, small_params) is not loaded
+
+def test_staged_training_reports_progress_and_matches_single_fit(artifact_dir):
+    data, _ = create_sleep_model.clean_model_data(sleep_dataset_path)
+    params = {"n_estimators": 7, "max_depth": 4, "random_state": 42}
+    model, model_metrics = create_sleep_model.fit_and_evaluate(data, params)
+    messages = []
+    staged, staged_metrics = create_sleep_model.fit_and_evaluate(data, params, progress=messages.append, stages=3)
+
+    assert messages == ["Trained 3/7 trees", "Trained 6/7 trees", "Trained 7/7 trees"]
+    assert not staged.warm_start and staged.n_estimators == 7
+    # Same trees, the threads of predict only change the order they are added up in
+    np.testing.assert_allclose(staged.predict(data[create_sleep_model.features]),
+                               model.predict(data[create_sleep_model.features]), rtol=1e-12)
+    assert staged_metrics == pytest.approx(model_metrics)
+
+def test_convert_bedtimes_to_minutes_after_10():
+    midpoints = create_sleep_model.convert_bedtimes_to_minutes_after_10(["23:30", "01:00", "21:00", "7:05"], [7, 8, 0, 1.5])
+    assert midpoints.tolist() == [300, 420, 1380, 590]
+    assert create_sleep_model.convert_bedtime_to_minutes_after_10("23:30", 7) == 300
+    with pytest.raises(ValueError):
+        create_sleep_model.convert_bedtimes_to_minutes_after_10(["23:30", "25:00"], 7)
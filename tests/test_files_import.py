@@ -1,6 +1,7 @@
 import unittest
 import pandas as pd
 import os
+import tempfile
 from unittest.mock import patch, MagicMock
 import os
 import sys
@@ -44,6 +45,81 @@ class TestToCSV(unittest.TestCase):
             self.assertIsInstance(result, pd.DataFrame)
             self.assertTrue(result.empty)
 
+    def test_read_folder_combines_files_in_order(self):
+        """Test that read_folder reads every file concurrently and concatenates once, in file order"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for user, values in [("u01", [3, 4]), ("u00", [1, 2]), ("u02", [5])]:
+                pd.DataFrame({"level": values}).to_json(os.path.join(temp_dir, f"Stress_{user}.json"), orient="records")
+
+            result = files_import.read_folder(temp_dir, workers=2)
+            self.assertEqual(result["User"].tolist(), ["u00", "u00", "u01", "u01", "u02"])
+            self.assertEqual(result["level"].tolist(), [1, 2, 3, 4, 5])
+
+            streamed = list(files_import.iter_folder_frames(temp_dir, workers=1))
+            self.assertEqual([name for name, _ in streamed], ["Stress_u00.json", "Stress_u01.json", "Stress_u02.json"])
+
+    def test_read_folder_cached_reuses_and_invalidates(self):
+        """Test that an unchanged folder is loaded from the cache and a changed one is parsed again"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_dir = os.path.join(temp_dir, "Stress")
+            os.makedirs(data_dir)
+            cache_dir = os.path.join(temp_dir, "cache")
+            pd.DataFrame({"level": [1, 2]}).to_json(os.path.join(data_dir, "Stress_u00.json"), orient="records")
+
+            first = files_import.read_folder_cached(data_dir, cache_dir)
+            with patch('pandas.read_json', side_effect=AssertionError("should not parse")):
+                cached = files_import.read_folder_cached(data_dir, cache_dir)
+            pd.testing.assert_frame_equal(first, cached)
+
+            pd.DataFrame({"level": [3]}).to_json(os.path.join(data_dir, "Stress_u01.json"), orient="records")
+            rebuilt = files_import.read_folder_cached(data_dir, cache_dir)
+            self.assertEqual(rebuilt["level"].tolist(), [1, 2, 3])
+
+    def test_read_folder_cached_splices_changed_files(self):
+        """Test that only new or modified files are parsed and the result matches a full rebuild"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_dir = os.path.join(temp_dir, "Mood")
+            os.makedirs(data_dir)
+            cache_dir = os.path.join(temp_dir, "cache")
+
+            def write(user, rows):
+                pd.DataFrame(rows).to_json(os.path.join(data_dir, f"Mood_{user}.json"), orient="records")
+
+            write("u00", {"happy": [1, 2]})
+            write("u01", {"happy": [3], "sad": [1]})
+            write("u02", {"happy": [4, 5]})
+            files_import.read_folder_cached(data_dir, cache_dir)
+
+            os.remove(os.path.join(data_dir, "Mood_u01.json"))
+            write("u02", {"happy": [6]})
+            write("u59", {"happy": [7]})
+            with patch('files_import.read_json_file', wraps=files_import.read_json_file) as mock_read:
+                result = files_import.read_folder_cached(data_dir, cache_dir)
+            self.assertEqual(sorted(call.args[1] for call in mock_read.call_args_list), ["Mood_u02.json", "Mood_u59.json"])
+
+            pd.testing.assert_frame_equal(result, files_import.read_folder(data_dir))
+
+    def test_read_folder_cached_keeps_timestamps_as_epoch_seconds(self):
+        """Test that resp_time stays an integer in every file, so the cached folder has a single type per column"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_dir = os.path.join(temp_dir, "Sleep")
+            os.makedirs(data_dir)
+            cache_dir = os.path.join(temp_dir, "cache")
+            pd.DataFrame({"hour": [7, 8], "resp_time": [1364787447, 1364873847]}).to_json(os.path.join(data_dir, "Sleep_u00.json"), orient="records")
+            pd.DataFrame({"hour": [6], "resp_time": [1365000000]}).to_json(os.path.join(data_dir, "Sleep_u01.json"), orient="records")
+
+            result = files_import.read_folder_cached(data_dir, cache_dir)
+            self.assertTrue(pd.api.types.is_integer_dtype(result["resp_time"]))
+            self.assertEqual(result["resp_time"].tolist(), [1364787447, 1364873847, 1365000000])
+
+    def test_apply_schema_drops_values_outside_the_dtype(self):
+        """Test that fractional, out of range and non-numeric answers become missing instead of failing"""
+        data = pd.DataFrame({"level": [1, 2.5, 300, -5, "x", None], "rating": [1.5, 2, 3, 4, 5, 6]})
+        result = files_import.apply_schema(data, {"level": "Int8", "rating": "float32"})
+        self.assertEqual(str(result["level"].dtype), "Int8")
+        self.assertEqual(result["level"].tolist(), [1, pd.NA, pd.NA, -5, pd.NA, pd.NA])
+        self.assertEqual(result["rating"].tolist(), [1.5, 2, 3, 4, 5, 6])
+
     def tearDown(self):
         """Clean up test files"""
         if os.path.exists("test_output.csv"):
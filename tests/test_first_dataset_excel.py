@@ -0,0 +1,126 @@
+import os
+import sys
+import pytest
+from unittest.mock import patch
+import pandas as pd
+
+# Add the src directory to sys.path dynamically
+repo_root = os.path.dirname(os.path.abspath(__file__))
+src_path = os.path.join(repo_root, "..", "src")
+sys.path.append(src_path)
+import first_dataset_excel
+
+# Answers per survey, each user gets the same rows
+survey_rows = {
+    "Mood": [{"happyornot": 1, "happy": 3, "sadornot": 2, "sad": 1}, {"happyornot": 2, "happy": 2, "sadornot": 1, "sad": 4}],
+    "Mood1": [{"tomorrow": 1}, {"tomorrow": 2}],
+    "Mood2": [{"how": 1}, {"how": 2}, {"how": 3}, {"how": 1}],
+    "Exercise": [{"have": 1, "exercise": 2, "walk": 3}, {"have": 2, "exercise": 1, "walk": 1}],
+    "Stress": [{"level": 1}, {"level": 4}, {"level": 5}],
+    "Social": [{"number": 2}, {"number": 6}],
+    "Sleep": [{"hour": 9, "rate": 1}, {"hour": 11, "rate": 3}],
+    "Activity": [{"working": 1, "relaxing": 2, "other_working": 3, "other_relaxing": 4}],
+}
+
+# Fixtures
+@pytest.fixture
+def survey_folders(tmp_path, monkeypatch):
+    """Creates a small StudentLife-like dataset and points the module at it."""
+    for survey, rows in survey_rows.items():
+        folder = tmp_path / survey
+        folder.mkdir()
+        for user in ["u00", "u01", "u02"]:
+            pd.DataFrame(rows).to_json(folder / f"{survey}_{user}.json", orient="records")
+        monkeypatch.setitem(first_dataset_excel.survey_datasets, survey,
+                            {**first_dataset_excel.survey_datasets[survey], "Path": str(folder)})
+    grades_path = tmp_path / "grades.csv"
+    pd.DataFrame({"uid": ["u00", "u01"], " gpa all": [3.0, 3.5], " gpa 13s": [2.5, 4.0]}).to_csv(grades_path, index=False)
+    monkeypatch.setattr(first_dataset_excel, "grades_file_path", str(grades_path))
+    return tmp_path
+
+def test_check_survey_data_lists_files(survey_folders):
+    manifest = first_dataset_excel.check_survey_data()
+    assert set(manifest) == set(first_dataset_excel.survey_datasets)
+    assert manifest["Stress"] == ["Stress_u00.json", "Stress_u01.json", "Stress_u02.json"]
+
+def test_check_survey_data_missing_folder(survey_folders, monkeypatch):
+    monkeypatch.setitem(first_dataset_excel.survey_datasets, "Stress", {"Path": str(survey_folders / "missing"), "Important_Column": "level"})
+    with pytest.raises(FileNotFoundError):
+        first_dataset_excel.check_survey_data()
+
+def test_load_survey_data_loads_every_survey(survey_folders):
+    all_data = first_dataset_excel.load_survey_data(workers=4)
+    assert set(all_data) == set(first_dataset_excel.survey_datasets)
+    assert len(all_data["Stress"]) == 9
+    assert all_data["Stress"]["level"].dtype == "Int8"
+    assert all_data["Stress"]["User"].dtype == "category"
+    assert sorted(all_data["Stress"]["User"].unique()) == ["u00", "u01", "u02"]
+
+def test_build_excel_writes_output_once(survey_folders):
+    output_path = survey_folders / "output.xlsx"
+    with patch.object(pd.DataFrame, "to_excel", autospec=True, side_effect=pd.DataFrame.to_excel) as mock_to_excel:
+        first_dataset_excel.build_excel(str(output_path), cache_dir=None, extra_formats=("csv",))
+    assert mock_to_excel.call_count == 1
+
+    output = pd.read_excel(output_path)
+    pd.testing.assert_frame_equal(output, pd.read_csv(survey_folders / "output.csv"), check_dtype=False)
+    assert list(output.columns[:3]) == ["User", "gpa_all", "gpa_13s"]
+    assert output.loc[output["User"] == "u01", "gpa_all"].item() == 87.5
+    assert output.loc[output["User"] == "u01", "avg_stress_level"].item() == 2
+
+def test_create_grades_table_strips_column_names(tmp_path, monkeypatch):
+    grades_path = tmp_path / "grades.csv"
+    grades_path.write_text("uid, gpa all, gpa 13s, cs 65\nu00, 3.0, 2.0, 1\nu75, 4.0, 3.5, 1\n")
+    monkeypatch.setattr(first_dataset_excel, "grades_file_path", str(grades_path))
+    grades = first_dataset_excel.create_grades_table()
+    assert grades["User"].tolist() == ["u00", "u75"]
+    assert grades["gpa_all"].tolist() == [75.0, 100.0]
+    assert grades["gpa_13s"].tolist() == [50.0, 87.5]
+
+def test_aggregate_by_user_single_pass():
+    feeling_data = pd.DataFrame({"User": ["u00", "u00", "u01"], "how": [1, 3, 3]})
+    feeling_data["happy_entry"] = feeling_data["how"].where(feeling_data["how"] == 1)
+    feeling_data["stressed_entry"] = feeling_data["how"].where(feeling_data["how"] == 2)
+    feeling_data["sad_entry"] = feeling_data["how"].where(feeling_data["how"] == 3)
+    result = first_dataset_excel.aggregate_by_user(feeling_data, "Mood2")
+    assert result.loc["u00", "total_mood_entries"] == 4
+    assert result.loc["u01", "sad_entry_sum"] == 3
+    # No happy answers means a missing sum, not zero
+    assert pd.isna(result.loc["u01", "happy_entry_sum"])
+    assert result["stressed_entry_sum"].isna().all()
+
+def test_map_answers_handles_unknown_codes():
+    answers = pd.Series([1, 5, 7, None, 2.5, -1], index=[10, 11, 12, 13, 14, 15])
+    result = first_dataset_excel.map_answers(answers, "stress")
+    assert result.index.tolist() == answers.index.tolist()
+    assert result.iloc[:2].tolist() == [3, 1]
+    assert result.iloc[2:].isna().all()
+
+def test_load_answer_mappings_overrides(tmp_path):
+    mappings_path = tmp_path / "answer_mappings.json"
+    mappings_path.write_text('{"stress": {"1": 10, "2": 20}}')
+    tables = first_dataset_excel.load_answer_mappings(str(mappings_path))
+    assert first_dataset_excel.map_answers(pd.Series([2, 1, 5]), "stress", tables).tolist()[:2] == [20, 10]
+    assert pd.isna(first_dataset_excel.map_answers(pd.Series([5]), "stress", tables).iloc[0])
+
+    # The defaults are not changed, and come back once the file is removed
+    assert first_dataset_excel.map_answers(pd.Series([2]), "stress").tolist() == [4]
+    mappings_path.unlink()
+    tables = first_dataset_excel.load_answer_mappings(str(mappings_path))
+    assert first_dataset_excel.map_answers(pd.Series([2]), "stress", tables).tolist() == [4]
+
+def test_discover_users_beyond_sixty():
+    all_data = {"Stress": pd.DataFrame({"User": ["u100", "u02"]}), "Sleep": pd.DataFrame()}
+    grades = pd.DataFrame({"User": ["u99", "u02"]})
+    users = first_dataset_excel.discover_users(all_data, grades)
+    assert users.tolist() == ["u02", "u99", "u100"]
+    assert first_dataset_excel.create_user_column(users)["User"].tolist() == ["u02", "u99", "u100"]
+
+def test_build_excel_reports_progress_and_raises_missing_data(survey_folders, monkeypatch):
+    messages = []
+    first_dataset_excel.build_excel(str(survey_folders / "output.xlsx"), cache_dir=None, progress=messages.append)
+    assert messages[0] == "Checking the survey data" and messages[-1] == "Writing the output"
+
+    monkeypatch.setitem(first_dataset_excel.survey_datasets, "Stress", {"Path": str(survey_folders / "missing"), "Important_Column": "level"})
+    with pytest.raises(FileNotFoundError):
+        first_dataset_excel.build_excel(str(survey_folders / "output.xlsx"), cache_dir=None)
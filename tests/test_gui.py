@@ -0,0 +1,161 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add the src directory to sys.path dynamically
+repo_root = os.path.dirname(os.path.abspath(__file__))
+src_path = os.path.join(repo_root, "..", "src")
+sys.path.append(src_path)
+import gui
+import create_sleep_model
+import first_dataset_analysis
+import plotting
+
+sleep_dataset_path = os.path.abspath(os.path.join(repo_root, "..", "data", "cmu-sleep.csv"))
+
+# Stand-ins for the Tk widgets, the tests drive the polling themselves
+class FakeRoot:
+    def __init__(self):
+        self.scheduled = []
+        self.delayed = []  # Callbacks scheduled later than the polling, like the termination of a cancelled process
+
+    def after(self, delay, callback):
+        (self.scheduled if delay <= gui.TaskRunner.poll_interval_ms else self.delayed).append(callback)
+
+class FakeWidget:
+    def __init__(self):
+        self.states = []
+
+    def state(self, states):
+        self.states.append(states)
+
+    def set(self, value):
+        self.value = value
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+@pytest.fixture
+def runner():
+    return gui.TaskRunner(FakeRoot(), [FakeWidget()], FakeWidget(), FakeWidget(), FakeWidget())
+
+def wait_for_task(runner, timeout=10):
+    deadline = time.time() + timeout
+    while runner.task and time.time() < deadline:
+        runner.root.scheduled.pop(0)()
+        time.sleep(0.01)
+    assert runner.task is None
+
+def slow_task(steps, progress):
+    for step in range(steps):
+        progress(f"step {step}")
+        time.sleep(0.01)
+    return steps
+
+def render_task(directory, progress):
+    data = pd.DataFrame({"x": range(10), "y": [value ** 2 for value in range(10)], "group": [1, 2] * 5})
+    jobs = [plotting.correlation_job(data.assign(y=data["y"] + shift), "x", "y", ci=None) for shift in range(6)]
+    for shift, job in enumerate(jobs):
+        job["path"] = os.path.join(directory, f"figure{shift}.png")
+    plotting.render_figures(jobs, workers=1, progress=progress, manifest_path=os.path.join(directory, "manifest.json"))
+
+def failing_task(progress):
+    raise ValueError("bad data")
+
+def test_task_runner_reports_result_and_reenables_buttons(runner):
+    results = []
+    runner.run("Counting", slow_task, (3,), on_done=results.append)
+    assert runner.buttons[0].states == [["disabled"]]
+    runner.run("Counting again", slow_task, (3,), on_done=results.append)  # Ignored while a task runs
+
+    wait_for_task(runner)
+    assert results == [3]
+    assert runner.buttons[0].states[-1] == ["!disabled"]
+    assert runner.status.value == "Counting: done"
+
+def test_task_runner_reports_errors(runner):
+    errors = []
+    runner.run("Failing", failing_task, on_error=errors.append)
+    wait_for_task(runner)
+    assert isinstance(errors[0], ValueError)
+
+def test_task_runner_cancels_at_next_progress(runner):
+    results = []
+    runner.run("Counting", slow_task, (1000,), on_done=results.append)
+    runner.cancel()
+    wait_for_task(runner)
+    assert results == []
+    assert runner.status.value == "Counting: cancelled"
+
+def test_task_runner_runs_in_process(runner):
+    results = []
+    runner.run("Counting", slow_task, (2,), on_done=results.append, in_process=True)
+    wait_for_task(runner, timeout=60)
+    assert results == [2]
+
+def test_save_graphs_task_renders_in_process(runner, tmp_path, monkeypatch):
+    # An Excel file with every column of the plotted correlations, so many figures are pending
+    rng = np.random.default_rng(0)
+    columns = sorted({column for pair in first_dataset_analysis.correlations for column in pair})
+    df = pd.DataFrame(rng.normal(size=(20, len(columns))), columns=columns)
+    df.insert(0, "User", [f"u{i:02d}" for i in range(20)])
+    df.to_excel(tmp_path / "output.xlsx", index=False)
+    monkeypatch.chdir(tmp_path)
+
+    errors = []
+    runner.run("Saving the graphs", gui.run_saves_headless, (str(tmp_path / "output.xlsx"), sleep_dataset_path),
+               on_error=errors.append, in_process=True)
+    wait_for_task(runner, timeout=300)
+    assert errors == []
+    assert runner.status.value == "Saving the graphs: done"
+    assert len([name for name in os.listdir("results") if name.endswith(".png")]) > 2
+
+def test_cancelled_process_stops_cooperatively(runner, tmp_path):
+    runner.run("Rendering", render_task, (str(tmp_path),), in_process=True)
+    deadline = time.time() + 60
+    while "Saved" not in runner.status.value and time.time() < deadline:
+        runner.root.scheduled.pop(0)()
+        time.sleep(0.01)
+    worker = runner.task["worker"]
+    runner.cancel()
+    wait_for_task(runner, timeout=60)
+
+    # The process ended by itself, after recording the figures it saved
+    assert runner.status.value == "Rendering: cancelled"
+    worker.join(10)
+    assert worker.exitcode == 0
+    manifest = plotting.load_figure_manifest(str(tmp_path / "manifest.json"))
+    assert 1 <= len(manifest) < 6
+    assert all(os.path.exists(path) for path in manifest)
+
+def test_cancelled_training_stops_between_stages(runner, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(create_sleep_model, "_loaded_artifacts", {})
+    stages = []
+    fit_and_evaluate = create_sleep_model.fit_and_evaluate
+    def fit_and_count(data, params=None, n_jobs=-1, progress=None):
+        def counted_progress(message):
+            stages.append(message)
+            runner.task["cancel_event"].set()  # Cancelled during the first stage
+            progress(message)
+        return fit_and_evaluate(data, params, n_jobs, counted_progress)
+    monkeypatch.setattr(create_sleep_model, "fit_and_evaluate", fit_and_count)
+
+    runner.run("Training the model", gui.train_model, (sleep_dataset_path,))
+    wait_for_task(runner, timeout=120)
+    assert runner.status.value == "Training the model: cancelled"
+    assert len(stages) == 1
+    assert not os.path.exists(create_sleep_model.artifact_dir)
+
+def test_prediction_errors_are_not_all_input_errors(monkeypatch):
+    shown = []
+    monkeypatch.setattr(gui.messagebox, "showerror", lambda title, message: shown.append(title))
+    gui.show_prediction_error(ValueError("could not convert string to float"))
+    gui.show_prediction_error(FileNotFoundError("data/cmu-sleep.csv"))
+    assert shown == ["Input Error", "Prediction Error"]
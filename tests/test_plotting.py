@@ -0,0 +1,70 @@
+import os
+import sys
+import pytest
+import pandas as pd
+
+# Add the src directory to sys.path dynamically
+repo_root = os.path.dirname(os.path.abspath(__file__))
+src_path = os.path.join(repo_root, "..", "src")
+sys.path.append(src_path)
+import plotting
+
+@pytest.fixture
+def sleep_data():
+    return pd.DataFrame({
+        "study": [1, 1, 1, 2, 2, 2],
+        "TotalSleepTime": [7.5, 6.0, 8.0, 7.0, 6.5, 5.5],
+        "score": [75, 60, 90, 70, 65, 50],
+    })
+
+def test_render_figures_saves_every_job(sleep_data, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    jobs = [
+        plotting.correlation_matrix_job(sleep_data, "Grades Score"),
+        plotting.correlation_job(sleep_data, "TotalSleepTime", "score"),
+        plotting.regression_by_group_job(sleep_data, "study", "TotalSleepTime", "score"),
+    ]
+    messages = []
+    paths = plotting.render_figures(jobs, workers=2, progress=messages.append)
+
+    assert paths == ["results/Grades Score Feature Correlation.png", "results/score vs TotalSleepTime Correlation.png",
+                     "results/TotalSleepTime score Scatter Plot.png"]
+    assert all(os.path.getsize(path) > 0 for path in paths)
+    assert len(messages) == 3
+
+def test_jobs_keep_only_the_plotted_columns(sleep_data):
+    job = plotting.correlation_job(sleep_data, "TotalSleepTime", "score")
+    assert list(job["data"].columns) == ["TotalSleepTime", "score"]
+
+def test_render_figures_skips_unchanged_figures(sleep_data, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    jobs = [plotting.correlation_job(sleep_data, "TotalSleepTime", "score"),
+            plotting.regression_by_group_job(sleep_data, "study", "TotalSleepTime", "score")]
+    plotting.render_figures(jobs, workers=1)
+    manifest = plotting.load_figure_manifest()
+    assert set(manifest) == {job["path"] for job in jobs}
+
+    # Nothing changed, nothing is rendered
+    monkeypatch.setattr(plotting, "render_figure", lambda job: pytest.fail(f"rendered {job['path']}"))
+    plotting.render_figures(jobs)
+
+    # Only the figure whose data changed is rendered again
+    rendered = []
+    monkeypatch.setattr(plotting, "render_figure", lambda job: rendered.append(job["path"]) or job["path"])
+    changed_data = sleep_data.assign(score=sleep_data["score"] + 1)
+    jobs[0] = plotting.correlation_job(changed_data, "TotalSleepTime", "score")
+    plotting.render_figures(jobs)
+    assert rendered == [jobs[0]["path"]]
+    assert plotting.load_figure_manifest()[jobs[0]["path"]]["fingerprint"] != manifest[jobs[0]["path"]]["fingerprint"]
+
+    # A deleted figure is rendered again
+    os.remove(jobs[1]["path"])
+    plotting.render_figures(jobs)
+    assert rendered[1:] == [jobs[1]["path"]]
+
+def test_correlation_job_without_ci_has_precomputed_line(sleep_data, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    job = plotting.correlation_job(sleep_data, "TotalSleepTime", "score", ci=None)
+    assert set(job["stats"]) == {"correlation", "regression"}
+    assert plotting.render_figures([job]) == [job["path"]]
+    assert os.path.exists(job["path"])
@@ -0,0 +1,101 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import urllib.error
+import urllib.request
+import pytest
+import pandas as pd
+
+# Add the src directory to sys.path dynamically
+repo_root = os.path.dirname(os.path.abspath(__file__))
+src_path = os.path.join(repo_root, "..", "src")
+sys.path.append(src_path)
+import create_sleep_model
+import prediction_server
+
+sleep_dataset_path = os.path.join(repo_root, "..", "data", "cmu-sleep.csv")
+small_params = {"n_estimators": 5, "max_depth": 4, "random_state": 42}
+profile = {"TotalSleepTime": 7, "bedtime_mssd": 0.5, "bedtime": "23:30", "daytime_sleep": 20}
+
+# Fixtures
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(create_sleep_model, "_loaded_artifacts", {})
+    monkeypatch.chdir(tmp_path)  # The cleaned data is cached in the temporary data/cache
+    monkeypatch.setattr(create_sleep_model, "model_params", small_params)
+    server = prediction_server.create_server(sleep_dataset_path, port=0, directory=str(tmp_path / "models"))
+    server.models_directory = str(tmp_path / "models")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def request(server, path, body=None):
+    url = f"http://127.0.0.1:{server.server_address[1]}{path}"
+    data = json.dumps(body).encode() if body is not None else None
+    with urllib.request.urlopen(urllib.request.Request(url, data=data)) as response:
+        return json.loads(response.read())
+
+def test_predict_matches_the_model(server):
+    single = request(server, "/predict", profile)["predictions"]
+    batch = request(server, "/predict", {"instances": [profile, profile]})["predictions"]
+
+    # The server's compiled model predicts the same scores as the sklearn model
+    midpoint = create_sleep_model.convert_bedtime_to_minutes_after_10("23:30", 7)
+    model, scaler = create_sleep_model.get_model(sleep_dataset_path, server.models_directory)
+    expected = create_sleep_model.predict_batch(model, scaler,
+                                                pd.DataFrame([[7, 0.5, midpoint, 20]], columns=create_sleep_model.features))
+    assert single == pytest.approx(list(expected))
+    assert batch == pytest.approx(list(expected) * 2)
+
+def test_concurrent_requests_are_batched(server):
+    server.batcher.max_wait = 0.2  # Long enough for the concurrent requests to share batches
+    start = threading.Barrier(20)
+    def send():
+        start.wait()
+        request(server, "/predict", [profile] * 3)
+    threads = [threading.Thread(target=send) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = request(server, "/stats")
+    assert stats["requests"] == 20
+    assert stats["batches"] < 20
+    assert stats["mean_requests_per_batch"] > 1
+    assert stats["p50_ms"] <= stats["p99_ms"]
+
+def test_invalid_input_is_rejected(server):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        request(server, "/predict", {"TotalSleepTime": 7})
+    assert error.value.code == 400
+    for body in (5, "profile", {"instances": 5}, [5], {**profile, "TotalSleepTime": "nan"},
+                 {**profile, "daytime_sleep": "Infinity"}):
+        with pytest.raises(urllib.error.HTTPError) as error:
+            request(server, "/predict", body)
+        assert error.value.code == 400
+    assert request(server, "/health") == {"status": "ok"}
+
+def test_prediction_errors_are_reported(server):
+    class BrokenModel:
+        def predict(self, data):
+            raise RuntimeError("broken model")
+    server.batcher.model = BrokenModel()
+    with pytest.raises(urllib.error.HTTPError) as error:
+        request(server, "/predict", profile)
+    assert error.value.code == 500
+    assert "broken model" in json.loads(error.value.read())["error"]
+
+def test_server_loads_the_compiled_model_without_sklearn(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    directory = str(tmp_path / "models")
+    create_sleep_model.train_and_save_model(sleep_dataset_path, directory, small_params)
+    code = ("import sys, create_sleep_model, prediction_server; "
+            f"create_sleep_model.model_params = {small_params!r}; "
+            f"server = prediction_server.create_server({sleep_dataset_path!r}, port=0, directory={directory!r}); "
+            "server.server_close(); sys.exit('sklearn' in sys.modules)")
+    assert subprocess.run([sys.executable, "-c", code], cwd=src_path).returncode == 0
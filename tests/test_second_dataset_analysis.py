@@ -53,5 +53,18 @@ class TestSecondDatasetAnalysis(unittest.TestCase):
         second_dataset_analysis.create_sleep_scatter_plots(data, True, False)
         self.assertEqual(mock_plot.call_count, 3)
 
+    def test_regression_results(self):
+        data = pd.DataFrame({
+            "study": [1, 1, 1, 2, 2, 2],
+            "midpoint_sleep": [450, 480, 420, 400, 430, 500],
+            "bedtime_mssd": [30, 45, 60, 20, 25, 50],
+            "TotalSleepTime": [450, 360, 480, 420, 390, 330],
+            "score": [75, 85, 90, 60, 70, 80]
+        })
+        results = second_dataset_analysis.regression_results(data)
+        self.assertEqual(len(results), 6)
+        self.assertEqual(results["group"].tolist(), ["1", "2"] * 3)
+        self.assertTrue((results["n"] == 3).all())
+
 if __name__ == "__main__":
     unittest.main()